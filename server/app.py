@@ -2,29 +2,62 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 from db import get_database
+from cache import start_catalog_change_listener
+import metrics
 from routes.auth_routes import auth_bp
 from routes.product_routes import products_bp
 from routes.order_routes import orders_bp
 from middlewares.error_handler import register_error_handlers
+from middlewares.auth_middleware import admin_required
+from middlewares.query_accounting import register_query_accounting
+from middlewares.compression import register_compression
+from json_provider import FastJSONProvider
 
-app = Flask(__name__)
-CORS(app)
 
-db = get_database()
+def create_app():
+    """
+    Application factory.
+    Nothing here touches MongoDB: each worker process creates its client lazily
+    on first use, after any fork by the production server.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    CORS(app)
+    
+    # Register blueprints
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(products_bp)
+    app.register_blueprint(orders_bp)
+    register_error_handlers(app)
+    register_query_accounting(app)
+    register_compression(app)
+    
+    @app.before_request
+    def start_background_workers():
+        # Per-process background work; a no-op once running in this process.
+        # Health checks skip it so a cold worker answers them without connecting to Mongo.
+        if request.endpoint == 'health_check':
+            return
+        start_catalog_change_listener(get_database())
+    
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        return jsonify({"status": "healthy"})
+    
+    @app.route('/api/metrics', methods=['GET'])
+    @admin_required
+    def metrics_snapshot():
+        return jsonify(metrics.snapshot())
+    
+    return app
 
-# Register blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(products_bp)
-app.register_blueprint(orders_bp)
-register_error_handlers(app)
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return jsonify({"status": "healthy"})
+app = create_app()
 
 if __name__ == '__main__':
+    # Development server; use `gunicorn -c gunicorn.conf.py wsgi:app` in production
     port = int(os.environ.get('PORT', 5002))
     print(f"\n🚀 Server is running on port {port}")
     app.run(debug=False, host='0.0.0.0', port=port)  # Note: debug=False and host='0.0.0.0'
 
-# source venv/bin/activate
\ No newline at end of file
+# source venv/bin/activate
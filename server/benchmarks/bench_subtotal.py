@@ -0,0 +1,49 @@
+"""
+Round trips and latency of calculate_subtotal against cart size.
+
+    python -m benchmarks.bench_subtotal --iterations 200
+"""
+import argparse
+import time
+
+from flask import Flask
+
+from json_provider import FastJSONProvider
+from benchmarks.common import connect_benchmark_db, seed_products, percentile
+from controllers.order_controller import calculate_subtotal
+
+CART_SIZES = [1, 5, 15, 30, 60]
+
+
+def run(iterations):
+    db, counter = connect_benchmark_db()
+    product_ids = seed_products(db, max(CART_SIZES))
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    
+    print(f"{'cart size':>10} {'round trips':>12} {'p50 ms':>8} {'p95 ms':>8}")
+    for size in CART_SIZES:
+        cart = {'items': [
+            {'product_id': str(product_id), 'quantity': 1, 'grind_option': 'Whole Bean'}
+            for product_id in product_ids[:size]
+        ]}
+        
+        latencies = []
+        round_trips = 0
+        for _ in range(iterations):
+            with app.test_request_context(json=cart):
+                counter.reset()
+                start = time.perf_counter()
+                response, status = calculate_subtotal()
+                latencies.append((time.perf_counter() - start) * 1000)
+                round_trips = counter.count
+                assert status == 200, response.get_json()
+        
+        print(f'{size:>10} {round_trips:>12} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+    run(args.iterations)
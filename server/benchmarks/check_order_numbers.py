@@ -0,0 +1,86 @@
+"""
+Uniqueness check for the order number allocator under high concurrency.
+
+Forked worker processes each run many threads that allocate order numbers at
+once, the way gunicorn workers with gthread serve checkouts. The parent
+allocates one number before forking, so every child starts with a copy of a
+partly used block and must lease its own instead. The check fails if any
+number repeats, if a number does not have the RD-YYYYMMDD-<7 base36> shape,
+or if a process paid more than one counters round trip per block.
+
+    python -m benchmarks.check_order_numbers --processes 4 --threads 32 --numbers 20000
+"""
+import argparse
+import math
+import multiprocessing
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from benchmarks.common import connect_benchmark_db
+from models.order_number import order_numbers
+
+ORDER_NUMBER_PATTERN = re.compile(r'^RD-\d{8}-[0-9A-Z]{7}$')
+
+
+def allocate(threads, count):
+    """Allocate `count` numbers from `threads` threads; returns (numbers, leases)"""
+    leases_before = order_numbers.leases
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        numbers = list(pool.map(lambda _: order_numbers.next_number(), range(count)))
+    return numbers, order_numbers.leases - leases_before
+
+
+def reconnect():
+    # The parent's client must not be used after fork
+    connect_benchmark_db(drop=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--numbers', type=int, default=20000, help='numbers allocated per process')
+    parser.add_argument('--backend', choices=['mongod', 'mongomock'], default='mongod',
+                        help='mongomock cannot be shared across processes, so it runs one process')
+    args = parser.parse_args(argv)
+
+    connect_benchmark_db(backend=args.backend)
+    first = order_numbers.next_number()
+
+    started = time.perf_counter()
+    if args.backend == 'mongomock' or args.processes == 1:
+        results = [allocate(args.threads, args.numbers)]
+    else:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(args.processes, mp_context=context, initializer=reconnect) as pool:
+            futures = [pool.submit(allocate, args.threads, args.numbers) for _ in range(args.processes)]
+            results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    numbers = [first] + [number for process_numbers, _ in results for number in process_numbers]
+    duplicates = len(numbers) - len(set(numbers))
+    malformed = [number for number in numbers if not ORDER_NUMBER_PATTERN.match(number)]
+    # A process leases once at start, then once per block it exhausts
+    max_leases = math.ceil(args.numbers / order_numbers.block_size) + 1
+    leases = [process_leases for _, process_leases in results]
+
+    print(f'{len(numbers)} numbers from {len(results)} process(es) x {args.threads} threads '
+          f'in {elapsed:.2f}s ({len(numbers) / elapsed:.0f}/s)')
+    print(f'block size {order_numbers.block_size}, counter leases per process: {leases} (max {max_leases})')
+    print(f'first {first}, last {max(numbers)}')
+
+    failed = False
+    for name, ok in [
+        (f'unique ({duplicates} duplicates)', duplicates == 0),
+        (f'well-formed ({len(malformed)} malformed)', not malformed),
+        ('one round trip per block', all(count <= max_leases for count in leases))
+    ]:
+        failed = failed or not ok
+        print(f"{'ok' if ok else 'FAIL':<5} {name}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
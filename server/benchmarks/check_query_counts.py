@@ -0,0 +1,68 @@
+"""
+Query-count regression check for the order history endpoints.
+
+Seeds a customer with a large order history and fails (exit code 1) if an
+endpoint issues more Mongo commands than its budget, which catches per-item
+lookups (N+1 patterns) creeping back in.
+
+    python -m benchmarks.check_query_counts
+"""
+import sys
+
+from bson import ObjectId
+from flask import Flask, g
+
+from json_provider import FastJSONProvider
+from benchmarks.common import connect_benchmark_db, seed_products, seed_orders
+from controllers.order_controller import get_all_orders, get_order_by_id
+from migrations.backfill_order_snapshots import backfill
+
+ORDER_COUNT = 50
+ITEMS_PER_ORDER = 3
+
+# Allowed commands per request (getMore batches of the same cursor are not counted)
+QUERY_BUDGETS = {
+    'get_all_orders (legacy items)': 2,    # orders + one batched product lookup
+    'get_order_by_id (legacy items)': 2,   # order + one batched product lookup
+    'get_all_orders': 1,                   # orders only, items carry product snapshots
+    'get_order_by_id': 1                   # order only
+}
+
+
+def count_commands(app, counter, user_id, view, *args):
+    with app.test_request_context():
+        g.current_user_id = str(user_id)
+        counter.reset()
+        response, status = view(*args)
+        assert status == 200, response.get_json()
+        return len([name for name in counter.commands if name != 'getMore'])
+
+
+def main():
+    db, counter = connect_benchmark_db()
+    product_ids = seed_products(db, 20)
+    user_id = ObjectId()
+    order_ids = seed_orders(db, user_id, product_ids, ORDER_COUNT, ITEMS_PER_ORDER)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    
+    # Seeded orders have no product snapshots, like orders placed before snapshots existed
+    counts = {
+        'get_all_orders (legacy items)': count_commands(app, counter, user_id, get_all_orders),
+        'get_order_by_id (legacy items)': count_commands(app, counter, user_id, get_order_by_id, str(order_ids[0]))
+    }
+    backfill(db, batch_size=20)
+    counts['get_all_orders'] = count_commands(app, counter, user_id, get_all_orders)
+    counts['get_order_by_id'] = count_commands(app, counter, user_id, get_order_by_id, str(order_ids[0]))
+    
+    failed = False
+    for name, count in counts.items():
+        budget = QUERY_BUDGETS[name]
+        status = 'ok' if count <= budget else 'FAIL'
+        failed = failed or count > budget
+        print(f'{status:<5} {name}: {count} commands (budget {budget})')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a real MongoDB (MONGODB_URI, default localhost) in a
+separate database so they never touch application data. Run them from the
+server directory, e.g. `python -m benchmarks.bench_subtotal`.
+"""
+import os
+import random
+import threading
+from datetime import datetime
+
+import bcrypt
+from pymongo import MongoClient, monitoring
+
+from db import Database, client_options
+from models.order import Order
+from models.product import Product
+from models.user import User
+
+BENCHMARK_DB_NAME = os.getenv('BENCHMARK_DB_NAME', 'roastdirect_bench')
+
+ROAST_LEVELS = ['light', 'medium', 'dark']
+PROCESSING_METHODS = ['washed', 'natural', 'honey']
+COUNTRIES = ['Ethiopia', 'Colombia', 'Kenya', 'Guatemala', 'Brazil', 'Peru']
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts Mongo commands (round trips) issued through the client"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.commands = []
+    
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.commands = []
+    
+    def started(self, event):
+        with self._lock:
+            self.count += 1
+            self.commands.append(event.command_name)
+    
+    def succeeded(self, event):
+        pass
+    
+    def failed(self, event):
+        pass
+
+
+def connect_benchmark_db(drop=True, backend='mongod'):
+    """
+    Point the application's Database singleton at the benchmark database.
+    Returns (db, counter) where counter sees every command the controllers send.
+    
+    backend='mongomock' uses an in-memory stand-in (pip install mongomock) when no
+    mongod is available; it has no command monitoring or transactions, so command
+    counts read zero and transactional endpoints report errors.
+    """
+    counter = CommandCounter()
+    if backend == 'mongomock':
+        import mongomock
+        client = mongomock.MongoClient()
+        # No change streams in the stand-in
+        os.environ['CATALOG_CACHE_CHANGE_STREAM'] = 'false'
+    else:
+        options = client_options()
+        options['event_listeners'] = options['event_listeners'] + [counter]
+        client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'), **options)
+    if drop:
+        client.drop_database(BENCHMARK_DB_NAME)
+    
+    database = Database()
+    database._client = client
+    database._db = client[BENCHMARK_DB_NAME]
+    database._pid = os.getpid()
+    return database._db, counter
+
+
+def seed_users(db, count):
+    """Insert `count` users (password 'benchmark') and return their ids"""
+    # Low cost factor: seeding speed matters here, login cost is measured separately
+    password = bcrypt.hashpw(b'benchmark', bcrypt.gensalt(rounds=4)).decode('utf-8')
+    users = [
+        User(
+            email=f'bench{i}@roastdirect.test',
+            password=password,
+            first_name='Bench',
+            last_name=f'User{i}'
+        ).to_dict()
+        for i in range(count)
+    ]
+    result = db.users.insert_many(users)
+    return result.inserted_ids
+
+
+def seed_products(db, count, inventory_count=10000):
+    """Insert `count` active products and return their ids"""
+    products = []
+    for i in range(count):
+        product = Product(
+            name=f'Benchmark Coffee {i}',
+            description='Benchmark product ' * 20,
+            price=round(random.uniform(12, 40), 2),
+            roast_level=random.choice(ROAST_LEVELS),
+            origin_country=random.choice(COUNTRIES),
+            elevation=random.randint(1000, 2200),
+            inventory_count=inventory_count,
+            farm_info='Benchmark farm ' * 10,
+            processing_method=random.choice(PROCESSING_METHODS),
+            tasting_notes=['chocolate', 'citrus', 'caramel']
+        )
+        products.append(product.to_dict())
+    result = db.products.insert_many(products)
+    return result.inserted_ids
+
+
+def seed_orders(db, user_id, product_ids, count, items_per_order=3):
+    """Insert `count` orders for one user, each referencing `items_per_order` products"""
+    orders = []
+    for _ in range(count):
+        items = [
+            {
+                'product_id': product_id,
+                'quantity': random.randint(1, 3),
+                'price_at_time': round(random.uniform(12, 40), 2),
+                'grind_option': 'Whole Bean'
+            }
+            for product_id in random.sample(list(product_ids), items_per_order)
+        ]
+        order = Order(
+            user_id=user_id,
+            items=items,
+            shipping_address={'street': '1 Bench St', 'city': 'Portland', 'state': 'OR', 'zip': '97201'},
+            final_total=sum(item['price_at_time'] * item['quantity'] for item in items)
+        )
+        orders.append(order.to_dict())
+    result = db.orders.insert_many(orders)
+    return result.inserted_ids
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def timestamp():
+    return datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
@@ -0,0 +1,250 @@
+"""
+Endpoint latency and throughput benchmark.
+
+Seeds a benchmark database (thousands of products, users with large order
+histories), serves the real Flask app on a local port and drives every
+route in routes/ over HTTP. For each route it records p50/p95/p99 latency,
+requests per second and Mongo commands per request (from the Server-Timing
+header). The results are written as JSON so runs can be compared across
+commits.
+
+    python -m benchmarks.run                                  # local mongod (MONGODB_URI)
+    python -m benchmarks.run --backend mongomock              # in-memory stand-in
+    python -m benchmarks.run --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from werkzeug.serving import make_server
+
+os.environ.setdefault('JWT_SECRET', 'benchmark-secret')
+os.environ.setdefault('REQUEST_LOG_ENABLED', 'false')
+
+from benchmarks.common import (
+    connect_benchmark_db, seed_products, seed_users, seed_orders, percentile, timestamp
+)
+from controllers.auth_controller import generate_jwt_token
+from utils.quotes import issue_quote
+from migrations.indexes import apply_indexes
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+CHECKOUT_PAYMENT = {
+    'card_number': '4242 4242 4242 4242',
+    'cardholder_name': 'Bench User',
+    'cvc': '123',
+    'exp_month': 12,
+    'exp_year': datetime.utcnow().year + 2,
+    'shipping_address': {'street': '1 Bench St', 'city': 'Portland', 'state': 'OR', 'zip': '97201'},
+    'billing_address': {'street': '1 Bench St', 'city': 'Portland', 'state': 'OR', 'zip': '97201'}
+}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def seed(db, args):
+    """Seed the benchmark database and return the fixtures the scenarios need"""
+    print(f'Seeding {args.products} products, {args.users} users x {args.orders_per_user} orders...')
+    product_ids = seed_products(db, args.products)
+    user_ids = seed_users(db, args.users)
+    order_ids = {}
+    for user_id in user_ids:
+        order_ids[user_id] = seed_orders(db, user_id, product_ids[:200], args.orders_per_user)
+    apply_indexes(db)
+
+    tokens = [generate_jwt_token(user_id, f'bench{i}@roastdirect.test') for i, user_id in enumerate(user_ids)]
+    return {
+        'product_ids': [str(product_id) for product_id in product_ids],
+        'user_ids': user_ids,
+        'tokens': tokens,
+        # Orders handed out one at a time to cancel/deliver scenarios, per user
+        'order_queue': {
+            i: iter([str(order_id) for order_id in order_ids[user_id]])
+            for i, user_id in enumerate(user_ids)
+        }
+    }
+
+
+def build_scenarios(fixtures):
+    """
+    One scenario per route. Each returns a function that builds request i as
+    (method, path, json_body, headers).
+    """
+    product_ids = fixtures['product_ids']
+    tokens = fixtures['tokens']
+    registrations = itertools.count()
+    queue_lock = threading.Lock()
+
+    def auth(i):
+        return {'Authorization': f'Bearer {tokens[i % len(tokens)]}'}
+
+    def cart(i, size=5):
+        return [
+            {'product_id': product_ids[(i + n) % len(product_ids)], 'quantity': 1, 'grind_option': 'Whole Bean'}
+            for n in range(size)
+        ]
+
+    def next_order(i):
+        with queue_lock:
+            return next(fixtures['order_queue'][i % len(tokens)], None) or 'missing'
+
+    def place_order_body(i):
+        items = [dict(item, price_at_time=20.0) for item in cart(i, 3)]
+        return {'items': items, 'shipping_address': CHECKOUT_PAYMENT['shipping_address'], 'final_total': 66.0}
+
+    def quoted_order_body(i):
+        # Same cart as place_order_body, redeemed through a signed final quote
+        snapshot = {'name': 'Benchmark Coffee', 'image_url': '', 'roast_level': 'medium'}
+        items = [[item['product_id'], 1, item['grind_option'], 20.0, snapshot] for item in cart(i, 3)]
+        totals = {'tax_amount': 3.0, 'shipping_cost': 3.0, 'final_total': 66.0}
+        quote = issue_quote(fixtures['user_ids'][i % len(tokens)], items, 60.0, totals)
+        return {'quote': quote, 'shipping_address': CHECKOUT_PAYMENT['shipping_address']}
+
+    return {
+        'auth.register': lambda i: ('POST', '/api/auth/register', {
+            'email': f'new{next(registrations)}-{time.time_ns()}@roastdirect.test',
+            'password': 'benchmark', 'first_name': 'New', 'last_name': 'User'
+        }, {}),
+        'auth.login': lambda i: ('POST', '/api/auth/login', {
+            'email': f'bench{i % len(tokens)}@roastdirect.test', 'password': 'benchmark'
+        }, {}),
+        'products.all_products': lambda i: ('GET', '/api/products/all_products', None, {}),
+        'products.all_products_page': lambda i: ('GET', '/api/products/all_products?sort=price&view=summary&limit=24', None, {}),
+        'products.product_by_id': lambda i: ('GET', f'/api/products/{product_ids[i % len(product_ids)]}', None, {}),
+        'products.add_product': lambda i: ('POST', '/api/products/add_product', {
+            'name': f'Bench Add {i}', 'description': 'Added during benchmark', 'price': 18.5,
+            'roast_level': 'medium', 'origin_country': 'Kenya', 'elevation': 1800,
+            'inventory_count': 100, 'farm_info': 'Bench farm', 'processing_method': 'washed',
+            'tasting_notes': ['berry']
+        }, auth(i)),
+        'orders.subtotal': lambda i: ('POST', '/api/orders/subtotal', {'items': cart(i)}, auth(i)),
+        'orders.final_total': lambda i: ('POST', '/api/orders/final_total', dict(CHECKOUT_PAYMENT, subtotal=100.0), auth(i)),
+        'orders.place_order': lambda i: ('POST', '/api/orders/place_order', place_order_body(i), auth(i)),
+        'orders.place_order_quoted': lambda i: ('POST', '/api/orders/place_order', quoted_order_body(i), auth(i)),
+        'orders.all_orders': lambda i: ('GET', '/api/orders/all_orders', None, auth(i)),
+        'orders.summary': lambda i: ('GET', '/api/orders/summary', None, auth(i)),
+        'orders.order_by_id': lambda i: ('GET', f'/api/orders/{next_order(i)}', None, auth(i)),
+        'orders.cancel': lambda i: ('POST', f'/api/orders/cancel/{next_order(i)}', None, auth(i)),
+        'orders.deliver': lambda i: ('POST', f'/api/orders/deliver/{next_order(i)}', None, auth(i))
+    }
+
+
+def run_scenario(base_url, build_request, count, concurrency):
+    """Send `count` requests with `concurrency` client threads and summarize them"""
+    local = threading.local()
+
+    def send(i):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        method, path, body, headers = build_request(i)
+        start = time.perf_counter()
+        response = local.session.request(method, base_url + path, json=body, headers=headers)
+        latency_ms = (time.perf_counter() - start) * 1000
+        match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+        return latency_ms, response.status_code, int(match.group(1)) if match else 0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(send, range(count)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _, _ in samples]
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        'requests': count,
+        'errors': sum(1 for _, status, _ in samples if status >= 500),
+        'statuses': statuses,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mongo_ops_per_request': round(sum(ops for _, _, ops in samples) / count, 2)
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+    print(f"{'route':<30} {'p50 ms':>16} {'p95 ms':>16} {'rps':>16} {'ops/req':>14}")
+    for route, current in results['routes'].items():
+        previous = baseline['routes'].get(route)
+        if not previous:
+            continue
+        cells = []
+        for key in ['p50_ms', 'p95_ms', 'rps', 'mongo_ops_per_request']:
+            cells.append(f"{previous[key]:.1f}->{current[key]:.1f}")
+        print(f'{route:<30} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16} {cells[3]:>14}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RoastDirect endpoint benchmark')
+    parser.add_argument('--backend', choices=['mongod', 'mongomock'], default='mongod')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--orders-per-user', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--routes', help='comma-separated subset of routes to run')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<timestamp>-<commit>.json)')
+    parser.add_argument('--compare', help='previous result file to compare against')
+    args = parser.parse_args()
+
+    db, _ = connect_benchmark_db(backend=args.backend)
+    fixtures = seed(db, args)
+
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    scenarios = build_scenarios(fixtures)
+    selected = args.routes.split(',') if args.routes else list(scenarios)
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': timestamp(),
+        'config': vars(args),
+        'routes': {}
+    }
+    print(f"{'route':<30} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rps':>8} {'ops/req':>8} {'5xx':>5}")
+    for name in selected:
+        summary = run_scenario(base_url, scenarios[name], args.requests, args.concurrency)
+        results['routes'][name] = summary
+        print(f"{name:<30} {summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} "
+              f"{summary['rps']:>8.1f} {summary['mongo_ops_per_request']:>8.2f} {summary['errors']:>5}")
+
+    server.shutdown()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['timestamp']}-{results['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
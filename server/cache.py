@@ -0,0 +1,208 @@
+"""
+In-process caches.
+
+TTLCache is a small thread-safe LRU cache with per-entry expiry. The user
+cache holds authenticated identities so auth_required can skip the users
+lookup for tokens it has recently seen. The catalog
+cache holds product responses and is invalidated explicitly by every write
+path that changes the catalog (add_product, place_order, cancel_order).
+Those calls only clear the calling worker's cache, so every worker also runs
+a change-stream listener that clears its cache when products or the stock
+counters of sharded products (inventory_shards) change elsewhere. The listener needs a replica set, which order transactions already
+require; set CATALOG_CACHE_CHANGE_STREAM=false to turn it off.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl_seconds`"""
+    
+    def __init__(self, name, max_entries, ttl_seconds):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped by every invalidation, so a value read before one is never stored after it
+        self.generation = 0
+    
+    def get(self, key):
+        """Return the cached value or None when missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key, value, generation=None):
+        """
+        Store a value. With `generation` (read before the value was computed) the value is
+        dropped when an invalidation happened in between, since it may already be stale.
+        """
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, key=None):
+        """Drop one key, or every entry when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+            self.generation += 1
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+CATALOG_CACHE_ENABLED = os.getenv('CATALOG_CACHE_ENABLED', 'true').lower() == 'true'
+
+catalog_cache = TTLCache(
+    'catalog',
+    max_entries=int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 256)),
+    ttl_seconds=float(os.getenv('CATALOG_CACHE_TTL_SECONDS', 30))
+)
+metrics.register('catalog_cache', catalog_cache.stats)
+
+
+def get_catalog_entry(key):
+    """Look up a cached catalog response"""
+    if not CATALOG_CACHE_ENABLED:
+        return None
+    return catalog_cache.get(key)
+
+
+def catalog_generation():
+    """Read before querying Mongo for a response that will be passed to set_catalog_entry"""
+    return catalog_cache.generation
+
+
+def set_catalog_entry(key, value, generation=None):
+    """Cache a catalog response unless the catalog was invalidated since `generation`"""
+    if CATALOG_CACHE_ENABLED:
+        catalog_cache.set(key, value, generation)
+
+
+def invalidate_catalog():
+    """Called by every write path that changes products or their inventory"""
+    catalog_cache.invalidate()
+
+
+USER_CACHE_ENABLED = os.getenv('USER_CACHE_ENABLED', 'true').lower() == 'true'
+
+# Authenticated user identities keyed by user id, used by auth_required
+user_cache = TTLCache(
+    'users',
+    max_entries=int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000)),
+    ttl_seconds=float(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+)
+metrics.register('user_cache', user_cache.stats)
+
+
+def get_cached_user(user_id):
+    if not USER_CACHE_ENABLED or not user_id:
+        return None
+    return user_cache.get(user_id)
+
+
+def set_cached_user(user_id, identity):
+    if USER_CACHE_ENABLED:
+        user_cache.set(user_id, identity)
+
+
+def invalidate_user(user_id):
+    """Call whenever a user's account details or role change"""
+    user_cache.invalidate(str(user_id))
+
+
+_listener_thread = None
+_listener_unavailable = False
+
+# Server error for change streams on a standalone mongod
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+# Collections whose changes affect catalog responses
+CATALOG_COLLECTIONS = ['products', 'inventory_shards']
+
+
+def _watch_catalog(db, stop_event):
+    """Invalidate the catalog cache whenever a catalog collection changes"""
+    global _listener_unavailable
+    resume_token = None
+    while not stop_event.is_set():
+        try:
+            # One database-level stream covers both collections
+            pipeline = [{'$match': {'ns.coll': {'$in': CATALOG_COLLECTIONS}}}]
+            with db.watch(pipeline, resume_after=resume_token, max_await_time_ms=1000) as stream:
+                # A change may have been missed while (re)connecting
+                invalidate_catalog()
+                while not stop_event.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        invalidate_catalog()
+                    resume_token = stream.resume_token
+        except Exception as e:
+            if getattr(e, 'code', None) == CHANGE_STREAMS_UNSUPPORTED:
+                # Standalone mongod: retrying cannot help
+                _listener_unavailable = True
+                print(f"Catalog change stream unavailable; changes from other workers expire with the TTL: {e}")
+                return
+            print(f"Catalog change stream error: {e}")
+            resume_token = None
+            stop_event.wait(5)
+
+
+def start_catalog_change_listener(db):
+    """
+    Start the change-stream listener in a daemon thread (requires a replica set).
+    On unless CATALOG_CACHE_CHANGE_STREAM=false; returns the stop event or None.
+    """
+    global _listener_thread
+    if not CATALOG_CACHE_ENABLED or os.getenv('CATALOG_CACHE_CHANGE_STREAM', 'true').lower() != 'true':
+        return None
+    if _listener_unavailable or (_listener_thread is not None and _listener_thread.is_alive()):
+        return None
+    
+    stop_event = threading.Event()
+    _listener_thread = threading.Thread(
+        target=_watch_catalog,
+        args=(db, stop_event),
+        name='catalog-change-stream',
+        daemon=True
+    )
+    _listener_thread.start()
+    return stop_event
@@ -1,9 +1,9 @@
 from flask import jsonify, request
-import bcrypt
 import jwt
 import os
 from datetime import datetime, timedelta
 from models.user import User
+from utils.passwords import hash_password, check_password, needs_rehash, record_rehash, PasswordHasherBusy
 from db import get_database
 
 
@@ -24,6 +24,12 @@ def generate_jwt_token(user_id, email):
     token = jwt.encode(payload, secret_key, algorithm='HS256')
     return token
 
+def busy_response():
+    """503 returned when the password hashing queue is full"""
+    response = jsonify({'error': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 def register():
     """Handle user signup"""
     try:
@@ -38,13 +44,11 @@ def register():
         if existing_user:
             return jsonify({'error': 'User already exists with this email'}), 409
         
-        password_bytes = data['password'].encode('utf-8')
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(password_bytes, salt)
+        hashed_password = hash_password(data['password'])
         
         new_user = User(
             email=data['email'],
-            password=hashed_password.decode('utf-8'),
+            password=hashed_password,
             first_name=data['first_name'],
             last_name=data['last_name']
         )
@@ -64,6 +68,8 @@ def register():
             }
         }), 201
         
+    except PasswordHasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
 
@@ -79,12 +85,17 @@ def login():
         if not user:
             return jsonify({'error': 'Invalid email or password'}), 401
         
-        password_bytes = data['password'].encode('utf-8')
-        hashed_password = user['password'].encode('utf-8')
-        
-        if not bcrypt.checkpw(password_bytes, hashed_password):
+        if not check_password(data['password'], user['password']):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with a different cost factor while we have the plain-text password
+        if needs_rehash(user['password']):
+            try:
+                User.update_password(user['_id'], hash_password(data['password']))
+                record_rehash()
+            except PasswordHasherBusy:
+                pass  # Try again on a later login rather than failing this one
+        
         token = generate_jwt_token(user['_id'], user['email'])
         
         return jsonify({
@@ -98,5 +109,7 @@ def login():
             }
         }), 200
         
+    except PasswordHasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
@@ -3,6 +3,16 @@ from db import get_database
 from bson import ObjectId
 from bson.errors import InvalidId
 from models.order import Order
+from models.product import Product
+from models.order_summary import OrderSummary
+from models.inventory import InventoryShards
+from transactions import run_transaction, AbortTransaction, TransactionConflict
+from cache import invalidate_catalog
+from utils.pagination import encode_cursor, decode_cursor, parse_page_size, keyset_filter, sort_values
+from utils.streaming import wants_streaming, batched, stream_json_list
+from utils.quotes import issue_quote, verify_quote, QuoteError
+from utils.idempotency import IdempotentRequest
+import os
 import random
 from datetime import datetime
 
@@ -12,6 +22,101 @@ VALID_GRIND_OPTIONS = [
     'Pour Over', 'French Press', 'Moka Pot', 'Auto Drip'
 ]
 
+# Fields needed to price and stock-check a cart line, plus the item snapshot carried in the quote
+SUBTOTAL_PRODUCT_PROJECTION = {
+    'name': 1, 'price': 1, 'inventory_count': 1, 'inventory_mode': 1, 'image_url': 1, 'roast_level': 1
+}
+
+# Fields needed to stock-check an order before reserving inventory, plus the item snapshot
+RESERVATION_PRODUCT_PROJECTION = {
+    'name': 1, 'inventory_count': 1, 'inventory_mode': 1, 'inventory_shards': 1, 'image_url': 1, 'roast_level': 1
+}
+
+# Fields shown next to each item in order history (only looked up for items without a snapshot)
+ORDER_ITEM_PRODUCT_PROJECTION = {'name': 1, 'image_url': 1, 'roast_level': 1}
+
+# Order history pagination (newest first, _id breaks ties between equal timestamps)
+ORDER_HISTORY_SORT = [('created_at', -1), ('_id', -1)]
+ORDERS_PAGE_SIZE = int(os.getenv('ORDERS_PAGE_SIZE', 50))
+ORDERS_MAX_PAGE_SIZE = int(os.getenv('ORDERS_MAX_PAGE_SIZE', 200))
+
+def parse_cart_items(items):
+    """
+    Validate cart items in order.
+    Returns (parsed_items, validation_error) where parsed_items holds (product_id, quantity, grind_option)
+    for every item before the first invalid one, and validation_error is that item's error response.
+    """
+    parsed_items = []
+    for item in items:
+        # Validate item structure
+        if not all(key in item for key in ['product_id', 'quantity', 'grind_option']):
+            return parsed_items, (jsonify({'error': 'Each item must have product_id, quantity, and grind_option'}), 400)
+        
+        try:
+            product_id = ObjectId(item['product_id'])
+            quantity = int(item['quantity'])
+            grind_option = item['grind_option']
+            
+            if quantity <= 0:
+                return parsed_items, (jsonify({'error': 'Quantity must be positive'}), 400)
+                
+            if grind_option not in VALID_GRIND_OPTIONS:
+                return parsed_items, (jsonify({'error': f'Invalid grind option. Must be one of: {", ".join(VALID_GRIND_OPTIONS)}'}), 400)
+            
+        except (InvalidId, ValueError):
+            return parsed_items, (jsonify({'error': 'Invalid product ID or quantity format'}), 400)
+        
+        parsed_items.append((product_id, quantity, grind_option))
+    
+    return parsed_items, None
+
+
+def price_cart(parsed_items, products):
+    """
+    Price parsed cart items against their products (keyed by _id).
+    Returns (error, subtotal, validated_items); items are checked in cart order so the
+    first failing item reports the same error as a per-item lookup would.
+    """
+    subtotal = 0
+    validated_items = []
+    
+    for product_id, quantity, grind_option in parsed_items:
+        product = products.get(product_id)
+        if not product:
+            return (jsonify({'error': f'Product not found or inactive'}), 404), None, None
+        
+        # Validate stock availability
+        if product['inventory_count'] < quantity:
+            return (jsonify({
+                'error': f'Insufficient stock for {product["name"]}. Available: {product["inventory_count"]}, Requested: {quantity}'
+            }), 400), None, None
+        
+        # Calculate item total
+        item_total = product['price'] * quantity
+        subtotal += item_total
+        
+        # Store validated item info for response
+        validated_items.append({
+            'product_id': product_id,
+            'product_name': product['name'],
+            'price_at_time': product['price'],
+            'quantity': quantity,
+            'item_total': round(item_total, 2),
+            'grind_option': grind_option
+        })
+    
+    return None, subtotal, validated_items
+
+
+def build_cart_quote(user_id, parsed_items, products, subtotal):
+    """Signed quote for a priced cart, redeemable by place_order once final totals are added"""
+    items = [
+        [str(product_id), quantity, grind_option, products[product_id]['price'], Order.product_snapshot(products[product_id])]
+        for product_id, quantity, grind_option in parsed_items
+    ]
+    return issue_quote(user_id, items, round(subtotal, 2))
+
+
 def calculate_subtotal():
     """Calculate subtotal for cart items"""
     try:
@@ -23,59 +128,31 @@ def calculate_subtotal():
         if not items or len(items) == 0:
             return jsonify({'error': 'Cart cannot be empty'}), 400
         
-        db = get_database()
-        subtotal = 0
-        validated_items = []
+        # Validate items in cart order; an invalid first item needs no product lookup. Otherwise
+        # the valid items before the invalid one are still priced, so their errors come first
+        parsed_items, validation_error = parse_cart_items(items)
+        if validation_error and not parsed_items:
+            return validation_error
+        
+        # Resolve every product in the cart with one query
+        products = Product.find_by_ids(
+            [product_id for product_id, _, _ in parsed_items],
+            projection=SUBTOTAL_PRODUCT_PROJECTION,
+            active_only=True
+        )
         
-        for item in items:
-            # Validate item structure
-            if not all(key in item for key in ['product_id', 'quantity', 'grind_option']):
-                return jsonify({'error': 'Each item must have product_id, quantity, and grind_option'}), 400
-            
-            try:
-                product_id = ObjectId(item['product_id'])
-                quantity = int(item['quantity'])
-                grind_option = item['grind_option']
-                
-                if quantity <= 0:
-                    return jsonify({'error': 'Quantity must be positive'}), 400
-                    
-                if grind_option not in VALID_GRIND_OPTIONS:
-                    return jsonify({'error': f'Invalid grind option. Must be one of: {", ".join(VALID_GRIND_OPTIONS)}'}), 400
-                
-            except (InvalidId, ValueError):
-                return jsonify({'error': 'Invalid product ID or quantity format'}), 400
-            
-            # Get product from database
-            product = db.products.find_one({'_id': product_id, 'is_active': True})
-            if not product:
-                return jsonify({'error': f'Product not found or inactive'}), 404
-            
-            # Validate stock availability
-            if product['inventory_count'] < quantity:
-                return jsonify({
-                    'error': f'Insufficient stock for {product["name"]}. Available: {product["inventory_count"]}, Requested: {quantity}'
-                }), 400
-            
-            # Calculate item total
-            item_total = product['price'] * quantity
-            subtotal += item_total
-            
-            # Store validated item info for response
-            validated_items.append({
-                'product_id': str(product_id),
-                'product_name': product['name'],
-                'price_at_time': product['price'],
-                'quantity': quantity,
-                'item_total': round(item_total, 2),
-                'grind_option': grind_option
-            })
+        error, subtotal, validated_items = price_cart(parsed_items, products)
+        if error:
+            return error
+        if validation_error:
+            return validation_error
         
         return jsonify({
             'message': 'Subtotal calculated successfully',
             'subtotal': round(subtotal, 2),
             'items': validated_items,
-            'item_count': len(validated_items)
+            'item_count': len(validated_items),
+            'quote': build_cart_quote(g.current_user_id, parsed_items, products, subtotal)
         }), 200
         
     except Exception as e:
@@ -83,18 +160,30 @@ def calculate_subtotal():
 
 
 def calculate_final_total():
-    """Calculate tax, shipping, and final total for order. Also sanitizes card info for security."""
+    """
+    Calculate tax, shipping, and final total for order. Also sanitizes card info for security.
+    With the quote from calculate_subtotal the subtotal is taken from the quote, and a final
+    quote locking in these totals is returned for place_order.
+    """
     try:
         data = request.get_json()
-        if not data or 'subtotal' not in data:
+        if not data or ('subtotal' not in data and not data.get('quote')):
             return jsonify({'error': 'Subtotal is required'}), 400
         
-        try:
-            subtotal = float(data['subtotal'])
-            if subtotal <= 0:
-                return jsonify({'error': 'Subtotal must be positive'}), 400
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid subtotal format'}), 400
+        quote = None
+        if data.get('quote'):
+            try:
+                quote = verify_quote(data['quote'], g.current_user_id)
+            except QuoteError as e:
+                return jsonify({'error': str(e)}), 400
+            subtotal = quote['s']
+        else:
+            try:
+                subtotal = float(data['subtotal'])
+                if subtotal <= 0:
+                    return jsonify({'error': 'Subtotal must be positive'}), 400
+            except (ValueError, TypeError):
+                return jsonify({'error': 'Invalid subtotal format'}), 400
         
         # Check for required payment fields
         required_payment_fields = [
@@ -170,7 +259,7 @@ def calculate_final_total():
         # Calculate final total
         final_total = round(subtotal + tax_amount + shipping_cost, 2)
         
-        return jsonify({
+        response = {
             'message': 'Order totals calculated and payment info validated successfully',
             'subtotal': subtotal,
             'tax_amount': tax_amount,
@@ -178,17 +267,140 @@ def calculate_final_total():
             'shipping_cost': shipping_cost,
             'final_total': final_total,
             'validation_passed': True
-        }), 200
+        }
+        if quote:
+            response['quote'] = issue_quote(g.current_user_id, quote['i'], subtotal, {
+                'tax_amount': tax_amount,
+                'shipping_cost': shipping_cost,
+                'final_total': final_total
+            })
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
 
 
+def order_placed_body(order, order_id):
+    return {
+        'message': 'Order placed successfully',
+        'order_id': str(order_id),
+        'order_number': order.order_number,
+        'final_total': order.final_total,
+        'status': order.status
+    }
+
+
+def order_placed_response(order, order_id):
+    return jsonify(order_placed_body(order, order_id)), 201
+
+
+def transaction_conflict_response():
+    """503 returned when a transaction keeps conflicting with concurrent writes"""
+    response = jsonify({'error': 'Too many concurrent updates, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+def place_quoted_order(data, idempotent=None):
+    """
+    Place an order from the final quote issued by calculate_final_total.
+    Items, prices and totals were validated when the quote was signed, so the only
+    database work is the inventory reservation and the order insert.
+    """
+    if 'shipping_address' not in data:
+        return jsonify({'error': 'Required fields: quote, shipping_address'}), 400
+    
+    user_id = g.current_user_id
+    try:
+        quote = verify_quote(data['quote'], user_id, require_totals=True)
+    except QuoteError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    processed_items = [
+        {
+            'product_id': ObjectId(product_id),
+            'quantity': quantity,
+            'price_at_time': price_at_time,
+            'grind_option': grind_option,
+            'product_snapshot': product_snapshot
+        }
+        for product_id, quantity, grind_option, price_at_time, product_snapshot in quote['i']
+    ]
+    
+    db = get_database()
+    
+    def reserve_and_insert(session):
+        if idempotent:
+            idempotent.claim(session)
+        
+        # The reservation reads the products in this transaction and checks each is still active and in stock
+        failed_index = Product.reserve_inventory(
+            [(item['product_id'], item['quantity']) for item in processed_items],
+            session=session
+        )
+        
+        if failed_index is not None:
+            product_name = processed_items[failed_index]['product_snapshot']['name']
+            raise AbortTransaction((jsonify({
+                'error': f'Failed to reserve inventory for {product_name}. Item may have been purchased by another user.'
+            }), 409))
+        
+        order = Order(
+            user_id=user_id,
+            items=processed_items,
+            shipping_address=data['shipping_address'],
+            billing_address=None,
+            payment_info=None,
+            final_total=quote['t']['final_total']
+        )
+        
+        order_result = db.orders.insert_one(order.to_dict(), session=session)
+        
+        if not order_result.inserted_id:
+            raise AbortTransaction((jsonify({'error': 'Failed to create order'}), 500))
+        
+        OrderSummary.record_placed(user_id, order.final_total, order.created_at, session=session)
+        if idempotent:
+            idempotent.store(201, order_placed_body(order, order_result.inserted_id), session=session)
+        return order, order_result.inserted_id
+    
+    try:
+        order, order_id = run_transaction('place_order', reserve_and_insert)
+    except AbortTransaction as e:
+        return e.response
+    except TransactionConflict:
+        return transaction_conflict_response()
+    
+    invalidate_catalog()
+    
+    return order_placed_response(order, order_id)
+
+
 def place_order():
-    """Place order and update inventory"""
+    """
+    Place order and update inventory.
+    With a final quote (see calculate_final_total) the quoted items and totals are used as-is;
+    otherwise items are validated and stock-checked from the request body.
+    With an Idempotency-Key header, a retried request replays the stored response
+    instead of placing a second order (see utils.idempotency).
+    """
     try:
         data = request.get_json()
         
+        try:
+            idempotent = IdempotentRequest.from_request(request, g.current_user_id, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if idempotent:
+            # Already committed: replay without starting a transaction or touching inventory
+            stored = idempotent.stored_response()
+            if stored:
+                return stored
+        
+        if data and data.get('quote'):
+            return place_quoted_order(data, idempotent)
+        
         # Validate required fields - only need items, shipping_address, final_total
         required_fields = ['items', 'shipping_address', 'final_total']
         if not data or not all(field in data for field in required_fields):
@@ -210,145 +422,311 @@ def place_order():
         except (ValueError, TypeError):
             return jsonify({'error': 'Invalid final total format'}), 400
         
-        db = get_database()
+        # Validate every item before starting the transaction
         processed_items = []
-        
-        # Start a session for atomic operations
-        with db.client.start_session() as session:
-            with session.start_transaction():
-                # Process each item
-                for item in items:
-                    if not all(key in item for key in ['product_id', 'quantity', 'price_at_time', 'grind_option']):
-                        return jsonify({'error': 'Each item must have product_id, quantity, price_at_time, and grind_option'}), 400
-                    
-                    try:
-                        product_id = ObjectId(item['product_id'])
-                        quantity = int(item['quantity'])
-                        price_at_time = float(item['price_at_time'])
-                        grind_option = item['grind_option']
-                        
-                        if quantity <= 0:
-                            return jsonify({'error': 'Quantity must be positive'}), 400
-                        if price_at_time <= 0:
-                            return jsonify({'error': 'Price must be positive'}), 400
-                        if grind_option not in VALID_GRIND_OPTIONS:
-                            return jsonify({'error': f'Invalid grind option. Must be one of: {", ".join(VALID_GRIND_OPTIONS)}'}), 400
-                            
-                    except (InvalidId, ValueError, TypeError):
-                        return jsonify({'error': 'Invalid item data format'}), 400
-                    
-                    # Get and validate product with stock check
-                    product = db.products.find_one({'_id': product_id, 'is_active': True}, session=session)
-                    if not product:
-                        return jsonify({'error': 'Product not found or inactive'}), 404
-                    
-                    # Final stock validation
-                    if product['inventory_count'] < quantity:
-                        return jsonify({
-                            'error': f'Insufficient stock for {product["name"]}. Available: {product["inventory_count"]}, Requested: {quantity}'
-                        }), 400
-                    
-                    # Update inventory atomically
-                    result = db.products.update_one(
-                        {'_id': product_id, 'inventory_count': {'$gte': quantity}},
-                        {'$inc': {'inventory_count': -quantity}},
-                        session=session
-                    )
-                    
-                    if result.modified_count == 0:
-                        return jsonify({
-                            'error': f'Failed to reserve inventory for {product["name"]}. Item may have been purchased by another user.'
-                        }), 409
-                    
-                    # Store processed item
-                    processed_items.append({
-                        'product_id': product_id,
-                        'quantity': quantity,
-                        'price_at_time': price_at_time,
-                        'grind_option': grind_option
-                    })
-
-                order = Order(
-                    user_id=user_id,
-                    items=processed_items,
-                    shipping_address=shipping_address,
-                    billing_address=None,
-                    payment_info=None,
-                    final_total=final_total
-                )
+        validation_error = None
+        for item in items:
+            if not all(key in item for key in ['product_id', 'quantity', 'price_at_time', 'grind_option']):
+                validation_error = (jsonify({'error': 'Each item must have product_id, quantity, price_at_time, and grind_option'}), 400)
+                break
+            
+            try:
+                product_id = ObjectId(item['product_id'])
+                quantity = int(item['quantity'])
+                price_at_time = float(item['price_at_time'])
+                grind_option = item['grind_option']
                 
-                order_result = db.orders.insert_one(order.to_dict(), session=session)
+                if quantity <= 0:
+                    validation_error = (jsonify({'error': 'Quantity must be positive'}), 400)
+                    break
+                if price_at_time <= 0:
+                    validation_error = (jsonify({'error': 'Price must be positive'}), 400)
+                    break
+                if grind_option not in VALID_GRIND_OPTIONS:
+                    validation_error = (jsonify({'error': f'Invalid grind option. Must be one of: {", ".join(VALID_GRIND_OPTIONS)}'}), 400)
+                    break
+                    
+            except (InvalidId, ValueError, TypeError):
+                validation_error = (jsonify({'error': 'Invalid item data format'}), 400)
+                break
+            
+            processed_items.append({
+                'product_id': product_id,
+                'quantity': quantity,
+                'price_at_time': price_at_time,
+                'grind_option': grind_option
+            })
+        
+        db = get_database()
+        
+        # Runs as one transaction, retried as a whole on write conflicts
+        def reserve_and_insert(session):
+            # Claim the key first so a concurrent duplicate conflicts before reading stock
+            if idempotent:
+                idempotent.claim(session)
+            
+            # Read every product in the order with one query
+            products = Product.find_by_ids(
+                [item['product_id'] for item in processed_items],
+                projection=RESERVATION_PRODUCT_PROJECTION,
+                active_only=True,
+                session=session
+            )
+            
+            # Stock check in item order, tracking what earlier lines of the same product take
+            remaining_stock = {}
+            for item in processed_items:
+                product = products.get(item['product_id'])
+                if not product:
+                    raise AbortTransaction((jsonify({'error': 'Product not found or inactive'}), 404))
                 
-                if not order_result.inserted_id:
-                    return jsonify({'error': 'Failed to create order'}), 500
+                available = remaining_stock.get(item['product_id'], product['inventory_count'])
+                if available < item['quantity']:
+                    raise AbortTransaction((jsonify({
+                        'error': f'Insufficient stock for {product["name"]}. Available: {available}, Requested: {item["quantity"]}'
+                    }), 400))
+                remaining_stock[item['product_id']] = available - item['quantity']
+            
+            if validation_error:
+                raise AbortTransaction(validation_error)
+            
+            # Decrement inventory for every item in one ordered bulk write (shard counters for hot products)
+            failed_index = Product.reserve_inventory(
+                [(item['product_id'], item['quantity']) for item in processed_items],
+                session=session,
+                sharded={
+                    product_id: product['inventory_shards']
+                    for product_id, product in products.items() if InventoryShards.is_sharded(product)
+                }
+            )
+            
+            if failed_index is not None:
+                product = products[processed_items[failed_index]['product_id']]
+                raise AbortTransaction((jsonify({
+                    'error': f'Failed to reserve inventory for {product["name"]}. Item may have been purchased by another user.'
+                }), 409))
+            
+            # Snapshot product details onto each item so history reads skip the products collection
+            for item in processed_items:
+                item['product_snapshot'] = Order.product_snapshot(products[item['product_id']])
+            
+            order = Order(
+                user_id=user_id,
+                items=processed_items,
+                shipping_address=shipping_address,
+                billing_address=None,
+                payment_info=None,
+                final_total=final_total
+            )
+            
+            order_result = db.orders.insert_one(order.to_dict(), session=session)
+            
+            if not order_result.inserted_id:
+                raise AbortTransaction((jsonify({'error': 'Failed to create order'}), 500))
+            
+            OrderSummary.record_placed(user_id, final_total, order.created_at, session=session)
+            if idempotent:
+                idempotent.store(201, order_placed_body(order, order_result.inserted_id), session=session)
+            return order, order_result.inserted_id
         
-        return jsonify({
-            'message': 'Order placed successfully',
-            'order_id': str(order_result.inserted_id),
-            'order_number': order.order_number,
-            'final_total': final_total,
-            'status': order.status
-        }), 201
+        try:
+            order, order_id = run_transaction('place_order', reserve_and_insert)
+        except AbortTransaction as e:
+            return e.response
+        except TransactionConflict:
+            return transaction_conflict_response()
+        
+        # Inventory moved, so cached catalog responses are stale
+        invalidate_catalog()
+        
+        return order_placed_response(order, order_id)
         
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
 
 
+def parse_order_history_query(user_id, args):
+    """Build the order history query and page size from request args. Raises ValueError on bad input."""
+    page_size = parse_page_size(args.get('limit'), ORDERS_PAGE_SIZE, ORDERS_MAX_PAGE_SIZE)
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor, len(ORDER_HISTORY_SORT)) if cursor else None
+    
+    query = {'user_id': ObjectId(user_id)}
+    if after:
+        query.update(keyset_filter(ORDER_HISTORY_SORT, after))
+    return query, page_size
+
+
+def trim_order_page(orders, page_size):
+    """Drop the look-ahead document and build the next cursor when another page exists"""
+    if len(orders) <= page_size:
+        return orders, None
+    orders = orders[:page_size]
+    return orders, encode_cursor(sort_values(orders[-1], ORDER_HISTORY_SORT))
+
+
+def unsnapshotted_product_ids(orders):
+    """Product ids of order items placed before product snapshots were stored (and not yet backfilled)"""
+    return [item['product_id'] for order in orders for item in order['items'] if not item.get('product_snapshot')]
+
+
+def item_product(item, products):
+    """
+    Product details for an order item: its snapshot, else the looked-up product, else None
+    (also for the placeholder snapshot the backfill writes for deleted products)
+    """
+    snapshot = item.get('product_snapshot')
+    if snapshot:
+        return None if snapshot.get('product_deleted') else snapshot
+    return products.get(item['product_id'])
+
+
+def format_order_summary(order, products):
+    """Format an order for the order history list"""
+    order_items = []
+    for item in order['items']:
+        product = item_product(item, products)
+        product_name = product['name'] if product else 'Unknown Product'
+        
+        order_items.append({
+            'product_id': item['product_id'],
+            'product_name': product_name,
+            'quantity': item['quantity'],
+            'price_at_time': item['price_at_time'],
+            'grind_option': item['grind_option'],
+            'item_total': round(item['price_at_time'] * item['quantity'], 2)
+        })
+    
+    return {
+        'order_id': order['_id'],
+        'order_number': order['order_number'],
+        'created_at': order['created_at'],
+        'status': order['status'],
+        'final_total': order['final_total'],
+        'item_count': len(order_items),
+        'items': order_items,
+        # Include basic shipping info for display
+        'shipping_address': {
+            'city': order['shipping_address'].get('city', ''),
+            'state': order['shipping_address'].get('state', ''),
+            'zip': order['shipping_address'].get('zip', '')
+        }
+    }
+
+
+def format_order_details(order, products):
+    """Format a single order for the order detail page"""
+    order_items = []
+    for item in order['items']:
+        product = item_product(item, products)
+        
+        order_items.append({
+            'product_id': item['product_id'],
+            'product_name': product['name'] if product else 'Product no longer available',
+            'image_url': product.get('image_url', '') if product else '',
+            'roast_level': product.get('roast_level', '') if product else '',
+            'quantity': item['quantity'],
+            'price_at_time': item['price_at_time'],
+            'grind_option': item['grind_option'],
+            'item_total': round(item['price_at_time'] * item['quantity'], 2)
+        })
+    
+    return {
+        'order_id': order['_id'],
+        'order_number': order['order_number'],
+        'user_id': order['user_id'],
+        'created_at': order['created_at'],
+        'status': order['status'],
+        'final_total': order['final_total'],
+        'items': order_items,
+        'shipping_address': order['shipping_address'],
+        'billing_address': order.get('billing_address'),
+        'payment_info': {
+            'payment_method': 'card',  # Default for portfolio demo
+            'last_four': '****'        # Masked for security
+        } if order.get('payment_info') else None
+    }
+
+
+def stream_order_history(orders, page_size):
+    """
+    Streamed order history: orders are read in batches, with one product lookup per batch
+    for items that have no snapshot, and formatted as they are written out.
+    """
+    page = {'count': 0, 'last': None, 'has_more': False}
+    
+    def items():
+        for batch in batched(orders):
+            remaining = page_size - page['count']
+            if len(batch) > remaining:
+                page['has_more'] = True
+                batch = batch[:remaining]
+            if not batch:
+                return
+            
+            products = Product.find_by_ids(
+                unsnapshotted_product_ids(batch),
+                projection=ORDER_ITEM_PRODUCT_PROJECTION
+            )
+            for order in batch:
+                page['count'] += 1
+                page['last'] = order
+                yield format_order_summary(order, products)
+    
+    def tail():
+        return {
+            'message': 'Orders retrieved successfully' if page['count'] else 'No orders found',
+            'count': page['count'],
+            'next_cursor': encode_cursor(sort_values(page['last'], ORDER_HISTORY_SORT)) if page['has_more'] else None
+        }
+    
+    return stream_json_list('orders', items(), tail)
+
+
+def find_order_history(query, page_size):
+    """Orders for this user, newest first; one extra document tells us whether another page exists"""
+    db = get_database()
+    return db.orders.find(query).sort(ORDER_HISTORY_SORT).limit(page_size + 1)
+
+
 def get_all_orders():
-    """Get all orders for the current user"""
+    """Get all orders for the current user (?stream=1 streams the list)"""
     try:
         user_id = g.current_user_id
-        db = get_database()
         
-        # Find all orders for this user, sorted by creation date (newest first)
-        orders = list(db.orders.find({'user_id': ObjectId(user_id)}).sort('created_at', -1))
+        try:
+            query, page_size = parse_order_history_query(user_id, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if wants_streaming(request.args):
+            return stream_order_history(find_order_history(query, page_size), page_size)
+        
+        orders = list(find_order_history(query, page_size))
+        
+        orders, next_cursor = trim_order_page(orders, page_size)
         
         if not orders:
             return jsonify({
                 'message': 'No orders found',
-                'orders': []
+                'orders': [],
+                'next_cursor': None
             }), 200
         
+        # Items without a snapshot get their product names from one batched query
+        products = Product.find_by_ids(
+            unsnapshotted_product_ids(orders),
+            projection=ORDER_ITEM_PRODUCT_PROJECTION
+        )
+        
         # Format orders for frontend display
-        formatted_orders = []
-        for order in orders:
-            # Get product names for display
-            order_items = []
-            for item in order['items']:
-                product = db.products.find_one({'_id': item['product_id']})
-                product_name = product['name'] if product else 'Unknown Product'
-                
-                order_items.append({
-                    'product_id': str(item['product_id']),
-                    'product_name': product_name,
-                    'quantity': item['quantity'],
-                    'price_at_time': item['price_at_time'],
-                    'grind_option': item['grind_option'],
-                    'item_total': round(item['price_at_time'] * item['quantity'], 2)
-                })
-            
-            # Format the order summary
-            formatted_order = {
-                'order_id': str(order['_id']),
-                'order_number': order['order_number'],
-                'created_at': order['created_at'],
-                'status': order['status'],
-                'final_total': order['final_total'],
-                'item_count': len(order_items),
-                'items': order_items,
-                # Include basic shipping info for display
-                'shipping_address': {
-                    'city': order['shipping_address'].get('city', ''),
-                    'state': order['shipping_address'].get('state', ''),
-                    'zip': order['shipping_address'].get('zip', '')
-                }
-            }
-            formatted_orders.append(formatted_order)
+        formatted_orders = [format_order_summary(order, products) for order in orders]
         
         return jsonify({
             'message': 'Orders retrieved successfully',
             'count': len(formatted_orders),
-            'orders': formatted_orders
+            'orders': formatted_orders,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -375,37 +753,13 @@ def get_order_by_id(order_id):
         if str(order['user_id']) != str(user_id):
             return jsonify({'error': 'Unauthorized access to this order'}), 403
         
-        # Get product details for each item
-        order_items = []
-        for item in order['items']:
-            product = db.products.find_one({'_id': item['product_id']})
-            
-            product_info = {
-                'product_id': str(item['product_id']),
-                'product_name': product['name'] if product else 'Product no longer available',
-                'image_url': product.get('image_url', '') if product else '',
-                'quantity': item['quantity'],
-                'price_at_time': item['price_at_time'],
-                'grind_option': item['grind_option'],
-                'item_total': round(item['price_at_time'] * item['quantity'], 2)
-            }
-            order_items.append(product_info)
-        
-        order_details = {
-            'order_id': str(order['_id']),
-            'order_number': order['order_number'],
-            'user_id': str(order['user_id']),
-            'created_at': order['created_at'],
-            'status': order['status'],
-            'final_total': order['final_total'],
-            'items': order_items,
-            'shipping_address': order['shipping_address'],
-            'billing_address': order.get('billing_address'),
-            'payment_info': {
-                'payment_method': 'card',  # Default for portfolio demo
-                'last_four': '****'        # Masked for security
-            } if order.get('payment_info') else None
-        }
+        # Items without a snapshot get their product details from one batched query
+        products = Product.find_by_ids(
+            unsnapshotted_product_ids([order]),
+            projection=ORDER_ITEM_PRODUCT_PROJECTION
+        )
+        
+        order_details = format_order_details(order, products)
         
         return jsonify({
             'message': 'Order retrieved successfully',
@@ -428,57 +782,68 @@ def cancel_order(order_id):
         
         db = get_database()
         
-        # Start a session for atomic operations
-        with db.client.start_session() as session:
-            with session.start_transaction():
-                # Find the order
-                order = db.orders.find_one({'_id': order_id}, session=session)
-                
-                if not order:
-                    return jsonify({'error': 'Order not found'}), 404
-                
-                # Verify the order belongs to the current user
-                if str(order['user_id']) != str(user_id):
-                    return jsonify({'error': 'Unauthorized access to this order'}), 403
-                
-                # Check if order is in a state that can be canceled
-                if order['status'] not in ['in-progress', 'processing']:
-                    return jsonify({
-                        'error': f"Order cannot be canceled in '{order['status']}' status"
-                    }), 400
-                
-                # Update order status
-                result = db.orders.update_one(
-                    {'_id': order_id},
-                    {'$set': {'status': 'canceled'}},
-                    session=session
-                )
-                
-                if result.modified_count == 0:
-                    return jsonify({'error': 'Failed to cancel order'}), 500
-                
-                # Restore inventory for each item
-                restored_items = []
-                for item in order['items']:
-                    product_id = item['product_id']
-                    quantity = item['quantity']
-                    
-                    # Add quantities back to inventory
-                    db.products.update_one(
-                        {'_id': product_id},
-                        {'$inc': {'inventory_count': quantity}},
-                        session=session
-                    )
-                    
-                    # Get product info for response
-                    product = db.products.find_one({'_id': product_id}, session=session)
-                    product_name = product['name'] if product else 'Unknown Product'
-                    
-                    restored_items.append({
-                        'product_id': str(product_id),
-                        'product_name': product_name,
-                        'quantity_restored': quantity
-                    })
+        # Runs as one transaction, retried as a whole on write conflicts
+        def cancel_and_restore(session):
+            # Find the order
+            order = db.orders.find_one({'_id': order_id}, session=session)
+            
+            if not order:
+                raise AbortTransaction((jsonify({'error': 'Order not found'}), 404))
+            
+            # Verify the order belongs to the current user
+            if str(order['user_id']) != str(user_id):
+                raise AbortTransaction((jsonify({'error': 'Unauthorized access to this order'}), 403))
+            
+            # Check if order is in a state that can be canceled
+            if order['status'] not in ['in-progress', 'processing']:
+                raise AbortTransaction((jsonify({
+                    'error': f"Order cannot be canceled in '{order['status']}' status"
+                }), 400))
+            
+            # Update order status
+            result = db.orders.update_one(
+                {'_id': order_id},
+                {'$set': {'status': 'canceled'}},
+                session=session
+            )
+            
+            if result.modified_count == 0:
+                raise AbortTransaction((jsonify({'error': 'Failed to cancel order'}), 500))
+            
+            OrderSummary.record_status_change(
+                order['user_id'], order['status'], 'canceled', order['final_total'], session=session
+            )
+            
+            # Restore inventory for every item (sharded products go back to a shard)
+            Product.restore_inventory(
+                [(item['product_id'], item['quantity']) for item in order['items']],
+                session=session
+            )
+            
+            # Product names for the response: snapshots, plus one lookup for older items
+            products = Product.find_by_ids(
+                unsnapshotted_product_ids([order]),
+                projection={'name': 1},
+                session=session
+            )
+            restored_items = []
+            for item in order['items']:
+                product = item_product(item, products)
+                restored_items.append({
+                    'product_id': str(item['product_id']),
+                    'product_name': product['name'] if product else 'Unknown Product',
+                    'quantity_restored': item['quantity']
+                })
+            return order, restored_items
+        
+        try:
+            order, restored_items = run_transaction('cancel_order', cancel_and_restore)
+        except AbortTransaction as e:
+            return e.response
+        except TransactionConflict:
+            return transaction_conflict_response()
+        
+        invalidate_catalog()
         
         return jsonify({
             'message': 'Order canceled successfully',
@@ -501,26 +866,41 @@ def mark_as_delivered(order_id):
         
         db = get_database()
         
-        # Find the order
-        order = db.orders.find_one({'_id': order_id})
-        if not order:
-            return jsonify({'error': 'Order not found'}), 404
-        
-        # Check if order can be marked as delivered
-        if order['status'] == 'canceled':
-            return jsonify({'error': 'Cannot mark canceled order as delivered'}), 400
-        
-        if order['status'] == 'delivered':
-            return jsonify({'message': 'Order is already marked as delivered'}), 200
-        
-        # Update order status
-        result = db.orders.update_one(
-            {'_id': order_id},
-            {'$set': {'status': 'delivered'}}
-        )
+        # The status change and the owner's order summary are updated atomically
+        def mark_delivered(session):
+            # Find the order
+            order = db.orders.find_one({'_id': order_id}, session=session)
+            if not order:
+                raise AbortTransaction((jsonify({'error': 'Order not found'}), 404))
+            
+            # Check if order can be marked as delivered
+            if order['status'] == 'canceled':
+                raise AbortTransaction((jsonify({'error': 'Cannot mark canceled order as delivered'}), 400))
+            
+            if order['status'] == 'delivered':
+                raise AbortTransaction((jsonify({'message': 'Order is already marked as delivered'}), 200))
+            
+            # Update order status
+            result = db.orders.update_one(
+                {'_id': order_id},
+                {'$set': {'status': 'delivered'}},
+                session=session
+            )
+            
+            if result.modified_count == 0:
+                raise AbortTransaction((jsonify({'error': 'Failed to update order status'}), 500))
+            
+            OrderSummary.record_status_change(
+                order['user_id'], order['status'], 'delivered', order['final_total'], session=session
+            )
+            return order
         
-        if result.modified_count == 0:
-            return jsonify({'error': 'Failed to update order status'}), 500
+        try:
+            order = run_transaction('mark_as_delivered', mark_delivered)
+        except AbortTransaction as e:
+            return e.response
+        except TransactionConflict:
+            return transaction_conflict_response()
         
         return jsonify({
             'message': 'Order marked as delivered successfully',
@@ -529,4 +909,17 @@ def mark_as_delivered(order_id):
         }), 200
         
     except Exception as e:
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+def get_order_summary():
+    """Order count, lifetime spend and last order date for the current user"""
+    try:
+        summary = OrderSummary.find_by_user(g.current_user_id)
+        return jsonify({
+            'message': 'Order summary retrieved successfully',
+            'summary': OrderSummary.to_response(summary)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Internal server error'}), 500
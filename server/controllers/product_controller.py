@@ -1,7 +1,39 @@
 from flask import jsonify, request
 from datetime import datetime
+import os
 from models.product import Product
+from models.inventory import InventoryShards
 from db import get_database
+from cache import get_catalog_entry, set_catalog_entry, catalog_generation, invalidate_catalog
+from utils.http_cache import PreparedBody, prepared_response
+from utils.pagination import encode_cursor, decode_cursor, parse_page_size, keyset_filter, sort_values
+from utils.streaming import wants_streaming, batched, stream_json_list
+
+# Fields shown on the catalog grid (?view=summary); the detail page keeps the full document
+PRODUCT_SUMMARY_PROJECTION = {
+    'name': 1,
+    'price': 1,
+    'roast_level': 1,
+    'origin_country': 1,
+    'processing_method': 1,
+    'inventory_count': 1,
+    'inventory_mode': 1,
+    'image_url': 1,
+    'created_at': 1
+}
+
+# Sortable catalog fields and their default order
+PRODUCT_SORT_FIELDS = {'price': 'asc', 'created_at': 'desc'}
+PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', 24))
+PRODUCTS_MAX_PAGE_SIZE = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 100))
+
+def catalog_cache_key(args):
+    return ('all_products', tuple(sorted(args.items(multi=True))))
+
+
+def product_cache_key(object_id):
+    return ('product', str(object_id))
+
 
 def add_product():
     """Add product (coffee item) to product schema in database"""
@@ -29,33 +61,149 @@ def add_product():
         db = get_database()
         result = db.products.insert_one(new_product.to_dict())
         product_id = result.inserted_id
+        invalidate_catalog()
 
         return jsonify({'message': 'Product added successfully', 'product_id': str(product_id)}), 201
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
 
 
-def get_all_products():
-    """Get all active products with available inventory for catalog display"""
-    try:
-        db = get_database()
+def parse_catalog_query(args):
+    """
+    Build the catalog listing query from request args. Raises ValueError on bad input.
+    Returns a dict with query, projection and, when paginating, sort, sort_key and page_size.
+    """
+    view = args.get('view', 'full')
+    if view not in ('full', 'summary'):
+        raise ValueError("View must be 'full' or 'summary'")
+    
+    spec = {
         # Only show products that are active AND have inventory > 0
-        products = db.products.find({
+        'query': {
             'is_active': True,
             'inventory_count': {'$gt': 0}
-        })
+        },
+        'projection': PRODUCT_SUMMARY_PROJECTION if view == 'summary' else None,
+        'sort': None
+    }
+    
+    if not any(param in args for param in ('sort', 'limit', 'cursor')):
+        return spec
+    
+    sort_field = args.get('sort', 'created_at')
+    if sort_field not in PRODUCT_SORT_FIELDS:
+        raise ValueError(f'Sort must be one of: {", ".join(PRODUCT_SORT_FIELDS)}')
+    
+    order = args.get('order', PRODUCT_SORT_FIELDS[sort_field])
+    if order not in ('asc', 'desc'):
+        raise ValueError("Order must be 'asc' or 'desc'")
+    
+    direction = 1 if order == 'asc' else -1
+    spec['sort'] = [(sort_field, direction), ('_id', direction)]
+    spec['sort_key'] = f'{sort_field}:{order}'
+    spec['page_size'] = parse_page_size(args.get('limit'), PRODUCTS_PAGE_SIZE, PRODUCTS_MAX_PAGE_SIZE)
+    
+    cursor = args.get('cursor')
+    if cursor:
+        # The cursor carries its sort key so it cannot be replayed against a different ordering
+        cursor_values = decode_cursor(cursor, len(spec['sort']) + 1)
+        if cursor_values[0] != spec['sort_key']:
+            raise ValueError('Cursor does not match the requested sort order')
+        spec['query'].update(keyset_filter(spec['sort'], cursor_values[1:]))
+    
+    return spec
+
+
+def build_catalog_response(products, spec):
+    """
+    Build the catalog response body from fetched products (page_size + 1 of them when paginating),
+    with shard totals already applied
+    """
+    next_cursor = None
+    if spec['sort'] and len(products) > spec['page_size']:
+        products = products[:spec['page_size']]
+        next_cursor = encode_cursor([spec['sort_key']] + sort_values(products[-1], spec['sort']))
+    
+    # Documents are returned as-is; the app's JSON provider encodes ObjectId and datetime
+    response = {
+        'message': 'Products retrieved successfully',
+        'products': products,
+        'count': len(products)
+    }
+    if spec['sort']:
+        response['next_cursor'] = next_cursor
+    return response
+
+
+def stream_catalog_response(products, spec):
+    """Streamed counterpart of build_catalog_response, reading the cursor in batches"""
+    page = {'count': 0, 'last': None, 'has_more': False}
+    
+    def items():
+        fetched = 0
+        for batch in batched(products):
+            InventoryShards.apply_totals(batch)
+            for product in batch:
+                if spec['sort'] and fetched == spec['page_size']:
+                    page['has_more'] = True
+                    return
+                fetched += 1
+                page['last'] = product
+                page['count'] += 1
+                yield product
+    
+    def tail():
+        response = {'count': page['count'], 'message': 'Products retrieved successfully'}
+        if spec['sort']:
+            response['next_cursor'] = (
+                encode_cursor([spec['sort_key']] + sort_values(page['last'], spec['sort']))
+                if page['has_more'] else None
+            )
+        return response
+    
+    return stream_json_list('products', items(), tail)
+
+
+def find_catalog_products(spec):
+    """Catalog cursor for a parsed query spec"""
+    db = get_database()
+    products = db.products.find(spec['query'], spec['projection'])
+    if spec['sort']:
+        # One extra document tells us whether another page exists
+        products = products.sort(spec['sort']).limit(spec['page_size'] + 1)
+    return products
+
+
+def get_all_products():
+    """
+    Get all active products with available inventory for catalog display.
+    
+    Optional query parameters:
+        view=summary          only the fields the catalog grid needs
+        sort=price|created_at keyset-paginated listing, with order=asc|desc
+        limit, cursor         page size and continuation cursor (also enable pagination)
+        stream=1              stream the body instead of building it in memory (not cached)
+    Without sort/limit/cursor every matching product is returned, as before.
+    """
+    try:
+        cache_key = catalog_cache_key(request.args)
+        cached = get_catalog_entry(cache_key)
+        if cached is not None:
+            return prepared_response(cached)
+        generation = catalog_generation()
+        
+        try:
+            spec = parse_catalog_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Convert MongoDB cursor to list and handle ObjectId serialization
-        products_list = []
-        for product in products:
-            product['_id'] = str(product['_id'])  # Convert ObjectId to string for JSON
-            products_list.append(product)
+        products = find_catalog_products(spec)
+        if wants_streaming(request.args):
+            return stream_catalog_response(products, spec)
         
-        return jsonify({
-            'message': 'Products retrieved successfully',
-            'products': products_list,
-            'count': len(products_list)
-        }), 200
+        prepared = PreparedBody(build_catalog_response(InventoryShards.apply_totals(list(products)), spec))
+        set_catalog_entry(cache_key, prepared, generation)
+        return prepared_response(prepared)
         
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
@@ -72,19 +220,26 @@ def get_product_by_id(product_id):
         except InvalidId:
             return jsonify({'error': 'Invalid product ID format'}), 400
         
+        cache_key = product_cache_key(object_id)
+        cached = get_catalog_entry(cache_key)
+        if cached is not None:
+            return prepared_response(cached)
+        generation = catalog_generation()
+        
         db = get_database()
         product = db.products.find_one({'_id': object_id, 'is_active': True})
         
         if not product:
             return jsonify({'error': 'Product not found'}), 404
+        InventoryShards.apply_totals([product])
         
-        # Convert ObjectId to string for JSON serialization
-        product['_id'] = str(product['_id'])
-        
-        return jsonify({
+        response = {
             'message': 'Product retrieved successfully',
             'product': product
-        }), 200
+        }
+        prepared = PreparedBody(response)
+        set_catalog_entry(cache_key, prepared, generation)
+        return prepared_response(prepared)
         
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
@@ -1,31 +1,99 @@
 from pymongo import MongoClient
 import os
+import threading
 from dotenv import load_dotenv
+from migrations.indexes import ensure_indexes as ensure_db_indexes
+from db_monitoring import pool_stats
+from middlewares.query_accounting import query_listener
 
 load_dotenv()
 
+
+def _env_int(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    return value.lower() == 'true' if value not in (None, '') else default
+
+
+def client_options():
+    """
+    MongoClient settings from the environment, shared by the app and the benchmark scripts.
+    The wait-queue and server-selection timeouts default low so an exhausted pool
+    or unreachable server fails fast instead of hanging the request.
+    """
+    options = {
+        'maxPoolSize': _env_int('MONGODB_MAX_POOL_SIZE', 100),
+        'minPoolSize': _env_int('MONGODB_MIN_POOL_SIZE', 0),
+        'maxConnecting': _env_int('MONGODB_MAX_CONNECTING', 2),
+        'waitQueueTimeoutMS': _env_int('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 2000),
+        'serverSelectionTimeoutMS': _env_int('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        'connectTimeoutMS': _env_int('MONGODB_CONNECT_TIMEOUT_MS', 5000),
+        'retryWrites': _env_bool('MONGODB_RETRY_WRITES', True),
+        'retryReads': _env_bool('MONGODB_RETRY_READS', True),
+        'event_listeners': [pool_stats, query_listener]
+    }
+    
+    # Optional settings are only passed when configured so the driver defaults apply otherwise
+    max_idle_time = _env_int('MONGODB_MAX_IDLE_TIME_MS')
+    if max_idle_time is not None:
+        options['maxIdleTimeMS'] = max_idle_time
+    socket_timeout = _env_int('MONGODB_SOCKET_TIMEOUT_MS')
+    if socket_timeout is not None:
+        options['socketTimeoutMS'] = socket_timeout
+    compressors = os.getenv('MONGODB_COMPRESSORS')  # e.g. "zstd,snappy,zlib"
+    if compressors:
+        options['compressors'] = compressors
+    
+    return options
+
+
 class Database:
     _instance = None
+    _lock = threading.Lock()
     _client = None
     _db = None
+    _pid = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
         return cls._instance
     
-    def connect(self):
-        if self._client is None:
-            self._client = MongoClient(os.getenv('MONGODB_URI'))
-            self._db = self._client['roastdirect']
-            print("MongoDB connection successful")
+    def connect(self, ensure_indexes=True):
+        with self._lock:
+            # A MongoClient must not be shared across fork, so each worker process creates its own
+            if self._client is None or self._pid != os.getpid():
+                self._client = MongoClient(os.getenv('MONGODB_URI'), **client_options())
+                self._db = self._client['roastdirect']
+                self._pid = os.getpid()
+                print(f"MongoDB connection successful (pid {self._pid})")
+                
+                # Reconcile declared indexes (skipped once the current index version is applied)
+                if ensure_indexes and os.getenv('MONGODB_AUTO_INDEX', 'true').lower() == 'true':
+                    try:
+                        ensure_db_indexes(self._db)
+                    except Exception as e:
+                        print(f"Index bootstrap skipped: {e}")
         return self._db
     
     def get_db(self):
-        if self._db is None:
+        if self._db is None or self._pid != os.getpid():
             return self.connect()
         return self._db
+    
+    def close(self):
+        """Close this process's client (used on worker shutdown)"""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._db = None
+            self._pid = None
 
 # Convenience function for easy importing
 def get_database():
-    return Database().get_db()
\ No newline at end of file
+    return Database().get_db()
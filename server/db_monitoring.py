@@ -0,0 +1,96 @@
+"""
+Mongo connection pool monitoring.
+
+PoolStats is registered on every MongoClient and keeps process-wide counters
+for sizing the pool against the number of workers: connections currently
+checked out, check-out wait times, wait-queue timeouts and pool clears.
+Exposed under mongo_pool in /api/metrics.
+"""
+import threading
+
+from pymongo import monitoring
+
+import metrics
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = {}
+        self.wait_time_total_ms = 0.0
+        self.wait_time_max_ms = 0.0
+        self.pool_clears = 0
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'open_connections': self.open_connections,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': dict(self.checkout_failures),
+                'avg_wait_ms': round(self.wait_time_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.wait_time_max_ms, 3),
+                'pool_clears': self.pool_clears
+            }
+    
+    def _record_wait(self, event):
+        duration = getattr(event, 'duration', None)
+        if duration is None:
+            return 0.0
+        wait_ms = duration * 1000
+        self.wait_time_max_ms = max(self.wait_time_max_ms, wait_ms)
+        return wait_ms
+    
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.checkouts += 1
+            self.wait_time_total_ms += self._record_wait(event)
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+    
+    def connection_check_out_failed(self, event):
+        # reason is 'timeout' when the wait queue timed out, 'poolClosed' or 'connectionError'
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+            self._record_wait(event)
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+    
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+
+
+pool_stats = PoolStats()
+metrics.register('mongo_pool', pool_stats.stats)
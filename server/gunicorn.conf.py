@@ -0,0 +1,48 @@
+"""
+Gunicorn settings for production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every value can be overridden with an environment variable. Workers are
+forked before the app touches MongoDB, and each worker creates its own
+client on first use. SIGTERM stops accepting connections and lets in-flight
+requests finish for up to GRACEFUL_TIMEOUT seconds before workers exit.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5002)}"
+
+# Worker processes x threads per worker; threads overlap Mongo round trips within a worker
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Do not import the app in the master: nothing Mongo-related may exist before fork
+preload_app = False
+
+timeout = int(os.getenv('WORKER_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth; jitter avoids restarting them all at once
+max_requests = int(os.getenv('MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.getenv('ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def _close_connections():
+    from db import Database
+    Database().close()
+
+
+def post_fork(server, worker):
+    # Drop anything inherited from the master so this worker connects lazily on its own
+    _close_connections()
+
+
+def worker_exit(server, worker):
+    # In-flight requests have drained by now; release this worker's connections
+    _close_connections()
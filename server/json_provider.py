@@ -0,0 +1,55 @@
+"""
+Flask JSON provider backed by orjson.
+
+Encodes ObjectId, datetime, date, Decimal and Decimal128 directly, so
+controllers can hand Mongo documents to jsonify without converting each
+field first. Datetimes keep Flask's HTTP-date format, so the wire format
+does not change for clients. If orjson is not installed, it falls back to
+the standard library encoder with the same type handling.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(o):
+    """Encode the types Mongo documents contain that JSON has no native form for"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime, date)):
+        return http_date(o)
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, Decimal):
+        return str(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    
+    def dumps(self, obj, **kwargs):
+        # Debug pretty-printing and other custom options go through the standard encoder
+        if orjson is None or kwargs.get('indent'):
+            kwargs.setdefault('default', _default)
+            return super().dumps(obj, **kwargs)
+        
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
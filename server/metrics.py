@@ -0,0 +1,23 @@
+"""
+Process-local metrics registry.
+
+Subsystems register a callable that returns a dict of counters; the
+/api/metrics endpoint returns a snapshot of every registered source.
+"""
+import threading
+
+_sources = {}
+_lock = threading.Lock()
+
+
+def register(name, source):
+    """Register a zero-argument callable returning a dict of metrics under `name`"""
+    with _lock:
+        _sources[name] = source
+
+
+def snapshot():
+    """Collect the current value of every registered metrics source"""
+    with _lock:
+        sources = dict(_sources)
+    return {name: source() for name, source in sources.items()}
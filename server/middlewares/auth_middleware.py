@@ -3,55 +3,89 @@ from functools import wraps
 import jwt
 import os
 from models.user import User
+from cache import get_cached_user, set_cached_user
 
-def auth_required(f):
+def authenticate_request():
     """
-    Decorator to require valid JWT authentication for routes
-    Usage: @auth_required above route function
+    Validate the request's JWT and store the user in g.
+    Returns an error response, or None when the request is authenticated.
     """
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        token = None
+    token = None
+    
+    # Check for Authorization header
+    if 'Authorization' in request.headers:
+        auth_header = request.headers['Authorization']
         
-        # Check for Authorization header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            
-            # Check for Bearer format
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-            else:
-                return jsonify({'error': 'Invalid authorization format. Use: Bearer <token>'}), 401
+        # Check for Bearer format
+        if auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
         else:
-            return jsonify({'error': 'Authorization header is required'}), 401
+            return jsonify({'error': 'Invalid authorization format. Use: Bearer <token>'}), 401
+    else:
+        return jsonify({'error': 'Authorization header is required'}), 401
+    
+    try:
+        # Get JWT secret and decode token
+        secret_key = os.getenv('JWT_SECRET')
+        payload = jwt.decode(token, secret_key, algorithms=['HS256'])
         
-        try:
-            # Get JWT secret and decode token
-            secret_key = os.getenv('JWT_SECRET')
-            payload = jwt.decode(token, secret_key, algorithms=['HS256'])
-            
+        # Use the cached identity for this user id when its email still matches the token
+        current_user = get_cached_user(payload.get('user_id'))
+        if current_user is None or current_user['email'] != payload['email']:
             # Get user from database
             user = User.find_by_email(payload['email'])
             if not user:
                 return jsonify({'error': 'User not found'}), 401
             
-            # Store user info for use in route
-            g.current_user_id = str(user['_id'])
-            g.current_user = {
+            current_user = {
                 'id': str(user['_id']),
                 'email': user['email'],
                 'first_name': user['first_name'],
                 'last_name': user['last_name'],
                 'role': user.get('role', 'customer')
             }
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        except:
-            return jsonify({'error': 'Authentication failed'}), 401
+            set_cached_user(current_user['id'], current_user)
+        
+        # Store user info for use in route
+        g.current_user_id = current_user['id']
+        g.current_user = dict(current_user)
         
+    except jwt.ExpiredSignatureError:
+        return jsonify({'error': 'Token has expired'}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({'error': 'Invalid token'}), 401
+    except:
+        return jsonify({'error': 'Authentication failed'}), 401
+    
+    return None
+
+
+def auth_required(f):
+    """
+    Decorator to require valid JWT authentication for routes
+    Usage: @auth_required above route function
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        error = authenticate_request()
+        if error:
+            return error
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
+def admin_required(f):
+    """
+    Decorator to require a valid JWT for a user with the admin role
+    Usage: @admin_required above route function
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        error = authenticate_request()
+        if error:
+            return error
+        if g.current_user.get('role') != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
         return f(*args, **kwargs)
     
-    return decorated_function
\ No newline at end of file
+    return decorated_function
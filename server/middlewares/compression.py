@@ -0,0 +1,115 @@
+"""
+Response compression negotiated on Accept-Encoding.
+
+JSON responses above COMPRESSION_MIN_SIZE are sent gzip- or brotli-encoded
+when the client accepts it. `Brotli` is in requirements.txt; an install
+without it falls back to gzip only. Pre-serialized bodies (utils.http_cache.PreparedBody)
+compress each encoding once and keep the result, so catalog responses
+served from the cache are never re-compressed. Everything else is
+compressed by the after_request hook registered here.
+"""
+import gzip
+import os
+import threading
+
+from flask import request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only without the package
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_LEVEL = int(os.getenv('BROTLI_LEVEL', 5))
+
+COMPRESSIBLE_MIMETYPES = {'application/json'}
+
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, encoding, size_in, size_out):
+        with self._lock:
+            self.responses[encoding] = self.responses.get(encoding, 0) + 1
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'enabled': COMPRESSION_ENABLED,
+                'brotli_available': brotli is not None,
+                'compressed': dict(self.responses),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None
+            }
+
+
+compression_stats = CompressionStats()
+metrics.register('compression', compression_stats.snapshot)
+
+
+def negotiate_encoding(size):
+    """Pick the encoding for a body of `size` bytes from the request's Accept-Encoding, or None"""
+    if not COMPRESSION_ENABLED or size < COMPRESSION_MIN_SIZE:
+        return None
+    accepted = request.accept_encodings
+    br_quality = accepted.quality('br') if brotli is not None else 0
+    gzip_quality = accepted.quality('gzip')
+    if br_quality and br_quality >= gzip_quality:
+        return 'br'
+    if gzip_quality:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """Compress `body` with the given encoding and record it in the metrics"""
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_LEVEL)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    compression_stats.record(encoding, len(body), len(compressed))
+    return compressed
+
+
+def add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def register_compression(app):
+    """Compress eligible JSON responses that were not already encoded by the view"""
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        add_vary(response)
+        body = response.get_data()
+        encoding = negotiate_encoding(len(body))
+        if encoding is None:
+            return response
+
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # A strong validator must differ between representations
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+        return response
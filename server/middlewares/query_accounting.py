@@ -0,0 +1,153 @@
+"""
+Per-request Mongo query accounting.
+
+A PyMongo CommandListener records every command issued while a request is
+being handled: how many, how long they took in total, and which ones were
+slow. Each response gets a Server-Timing header and a structured JSON log
+line. Slow requests, plus a random sample of the rest, also log their full
+command list, which makes N+1 query patterns visible in production.
+
+Listener callbacks run in the context of the code that issued the command
+(the request thread), so a ContextVar ties commands to requests.
+"""
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+
+from flask import request, g
+from pymongo import monitoring
+
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_COMMAND_MS = float(os.getenv('SLOW_COMMAND_MS', 100))
+QUERY_LOG_SAMPLE_RATE = float(os.getenv('QUERY_LOG_SAMPLE_RATE', 0.01))
+REQUEST_LOG_ENABLED = os.getenv('REQUEST_LOG_ENABLED', 'true').lower() == 'true'
+
+logger = logging.getLogger('roastdirect.requests')
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_stats = ContextVar('request_query_stats', default=None)
+
+
+class RequestQueryStats:
+    """Commands issued during one request"""
+    
+    def __init__(self):
+        self.count = 0
+        self.failed = 0
+        self.total_ms = 0.0
+        self.commands = []
+        self._pending = {}
+    
+    def started(self, event):
+        self.count += 1
+        collection = event.command.get(event.command_name) if event.command_name != 'getMore' else event.command.get('collection')
+        self._pending[(event.request_id, event.connection_id)] = (
+            event.command_name,
+            collection if isinstance(collection, str) else None
+        )
+    
+    def finished(self, event, failed=False):
+        name, collection = self._pending.pop((event.request_id, event.connection_id), (event.command_name, None))
+        duration_ms = event.duration_micros / 1000
+        self.total_ms += duration_ms
+        if failed:
+            self.failed += 1
+        self.commands.append({
+            'command': name,
+            'collection': collection,
+            'ms': round(duration_ms, 3),
+            'failed': failed
+        })
+    
+    def slow_commands(self):
+        return [command for command in self.commands if command['ms'] >= SLOW_COMMAND_MS]
+
+
+class QueryAccountingListener(monitoring.CommandListener):
+    """Routes command events to the stats of the request that issued them"""
+    
+    def started(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.started(event)
+    
+    def succeeded(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.finished(event)
+    
+    def failed(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.finished(event, failed=True)
+
+
+query_listener = QueryAccountingListener()
+
+
+def current_query_stats():
+    """Stats for the request being handled, or None outside a request"""
+    return _current_stats.get()
+
+
+def register_query_accounting(app):
+    """Attach per-request accounting, the Server-Timing header and request logging to the app"""
+    
+    @app.before_request
+    def start_query_accounting():
+        g.query_stats = RequestQueryStats()
+        g.query_stats_token = _current_stats.set(g.query_stats)
+        g.request_started_at = time.perf_counter()
+    
+    @app.after_request
+    def report_query_accounting(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        
+        total_ms = (time.perf_counter() - g.request_started_at) * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries", app;dur={total_ms:.2f}'
+        )
+        
+        if REQUEST_LOG_ENABLED:
+            slow = total_ms >= SLOW_REQUEST_MS
+            entry = {
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round(total_ms, 2),
+                'db_commands': stats.count,
+                'db_failed': stats.failed,
+                'db_ms': round(stats.total_ms, 2),
+                'user_id': g.get('current_user_id'),
+                'slow': slow
+            }
+            slow_commands = stats.slow_commands()
+            if slow_commands:
+                entry['slow_commands'] = slow_commands
+            if slow or random.random() < QUERY_LOG_SAMPLE_RATE:
+                entry['commands'] = stats.commands
+            logger.info(json.dumps(entry, default=str))
+        
+        return response
+    
+    @app.teardown_request
+    def stop_query_accounting(error=None):
+        token = g.pop('query_stats_token', None)
+        if token is not None:
+            try:
+                _current_stats.reset(token)
+            except ValueError:
+                # Reset from a different context (e.g. streamed response); just clear it
+                _current_stats.set(None)
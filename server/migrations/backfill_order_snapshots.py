@@ -0,0 +1,124 @@
+"""
+Backfill product snapshots onto existing order items.
+
+Orders placed before snapshots were stored only reference their products
+by id, so reading them needs a products lookup. This job copies the
+snapshot fields (see models.order.ORDER_ITEM_SNAPSHOT_FIELDS) onto every
+such item in batches of orders in _id order, with one products query
+and one bulk write per batch. After each batch it stores the last
+processed _id in schema_migrations, so an interrupted run picks up where it
+stopped:
+
+    python -m migrations.backfill_order_snapshots                  # run or resume
+    python -m migrations.backfill_order_snapshots --restart        # ignore the checkpoint
+    python -m migrations.backfill_order_snapshots --batch-size 200
+
+Items whose product no longer exists get a placeholder snapshot
+(models.order.UNKNOWN_PRODUCT_SNAPSHOT), so every item ends up snapshotted and
+history reads stop querying products for them. Responses show these items as
+before: "Unknown Product" in history, "Product no longer available" in detail.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from models.order import Order, UNKNOWN_PRODUCT_SNAPSHOT
+from migrations.indexes import META_COLLECTION
+
+META_ID = 'backfill_order_snapshots'
+
+# Orders with at least one item that still lacks a snapshot
+MISSING_SNAPSHOT_FILTER = {'items': {'$elemMatch': {'product_snapshot': {'$exists': False}}}}
+
+SNAPSHOT_PROJECTION = {'name': 1, 'image_url': 1, 'roast_level': 1}
+
+
+def _load_checkpoint(db):
+    meta = db[META_COLLECTION].find_one({'_id': META_ID}) or {}
+    return meta.get('last_order_id')
+
+
+def _save_checkpoint(db, last_order_id, updated, completed=False):
+    update = {
+        '$set': {'last_order_id': last_order_id, 'updated_at': datetime.utcnow(), 'completed': completed},
+        '$inc': {'orders_updated': updated}
+    }
+    db[META_COLLECTION].update_one({'_id': META_ID}, update, upsert=True)
+
+
+def backfill_batch(db, orders):
+    """Snapshot every unsnapshotted item of a batch of orders; returns the number of orders updated"""
+    product_ids = list({
+        item['product_id'] for order in orders for item in order['items'] if not item.get('product_snapshot')
+    })
+    products = {
+        product['_id']: product
+        for product in db.products.find({'_id': {'$in': product_ids}}, SNAPSHOT_PROJECTION)
+    }
+
+    operations = []
+    for order in orders:
+        updates = {}
+        for index, item in enumerate(order['items']):
+            if item.get('product_snapshot'):
+                continue
+            product = products.get(item['product_id'])
+            snapshot = Order.product_snapshot(product) if product else dict(UNKNOWN_PRODUCT_SNAPSHOT)
+            updates[f'items.{index}.product_snapshot'] = snapshot
+        if updates:
+            # Guard on the items array we read so a concurrent change is never overwritten by position
+            operations.append(UpdateOne({'_id': order['_id'], 'items': order['items']}, {'$set': updates}))
+
+    if not operations:
+        return 0
+    return db.orders.bulk_write(operations, ordered=False).modified_count
+
+
+def backfill(db, batch_size=500, restart=False, pause_seconds=0):
+    """Run (or resume) the backfill; returns the number of orders updated in this run"""
+    last_order_id = None if restart else _load_checkpoint(db)
+    updated_total = 0
+
+    while True:
+        query = dict(MISSING_SNAPSHOT_FILTER)
+        if last_order_id is not None:
+            query['_id'] = {'$gt': last_order_id}
+
+        orders = list(db.orders.find(query, {'items': 1}).sort('_id', 1).limit(batch_size))
+        if not orders:
+            break
+
+        updated = backfill_batch(db, orders)
+        updated_total += updated
+        last_order_id = orders[-1]['_id']
+        _save_checkpoint(db, last_order_id, updated)
+        print(f'Backfilled {updated} orders up to {last_order_id} ({updated_total} this run)')
+
+        if pause_seconds:
+            # Throttle so the backfill does not compete with live traffic
+            time.sleep(pause_seconds)
+
+    _save_checkpoint(db, last_order_id, 0, completed=True)
+    return updated_total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill product snapshots onto order items')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--restart', action='store_true', help='ignore the stored checkpoint and start over')
+    parser.add_argument('--pause', type=float, default=0, help='seconds to sleep between batches')
+    args = parser.parse_args(argv)
+
+    from db import Database
+    db = Database().connect(ensure_indexes=False)
+
+    updated = backfill(db, batch_size=args.batch_size, restart=args.restart, pause_seconds=args.pause)
+    print(f'Done: {updated} orders updated')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+Versioned index definitions for the roastdirect database.
+
+Indexes are declared once in INDEX_SPECS and reconciled against the live
+collections either from Database.connect() or from the command line:
+
+    python -m migrations.indexes            # report drift
+    python -m migrations.indexes --apply    # create/rebuild declared indexes
+
+Bump INDEX_VERSION whenever INDEX_SPECS changes so running deployments
+reconcile again on their next connect.
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 5
+
+# Options that are compared when checking an existing index for drift
+COMPARED_OPTIONS = ['unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds']
+
+# Products visible in the catalog; partial indexes only cover these documents
+CATALOG_FILTER = {'is_active': True, 'inventory_count': {'$gt': 0}}
+
+# How long place_order remembers an Idempotency-Key and its response
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_KEY_TTL_SECONDS', 24 * 60 * 60))
+
+INDEX_SPECS = {
+    'users': [
+        {
+            # User.find_by_email runs on every login/register
+            'name': 'email_unique',
+            'keys': [('email', 1)],
+            'options': {'unique': True}
+        }
+    ],
+    'orders': [
+        {
+            'name': 'order_number_unique',
+            'keys': [('order_number', 1)],
+            'options': {'unique': True}
+        },
+        {
+            # Order history: filter by user, newest first, keyset-paginated on (created_at, _id)
+            'name': 'user_created_at',
+            'keys': [('user_id', 1), ('created_at', -1), ('_id', -1)],
+            'options': {}
+        }
+    ],
+    'products': [
+        {
+            # Catalog listing only ever reads active, in-stock products
+            'name': 'catalog_active_in_stock',
+            'keys': [('is_active', 1), ('inventory_count', 1)],
+            'options': {'partialFilterExpression': CATALOG_FILTER}
+        },
+        {
+            # Paginated catalog sorted by price
+            'name': 'catalog_price',
+            'keys': [('price', 1), ('_id', 1)],
+            'options': {'partialFilterExpression': CATALOG_FILTER}
+        },
+        {
+            # Paginated catalog sorted by newest first
+            'name': 'catalog_created_at',
+            'keys': [('created_at', -1), ('_id', -1)],
+            'options': {'partialFilterExpression': CATALOG_FILTER}
+        }
+    ],
+    'inventory_shards': [
+        {
+            # One counter per (product, shard) for products with sharded inventory
+            'name': 'product_shard_unique',
+            'keys': [('product_id', 1), ('shard', 1)],
+            'options': {'unique': True}
+        }
+    ],
+    'idempotency_keys': [
+        {
+            # Expire stored place_order responses; replays only need to cover client retries
+            'name': 'created_at_ttl',
+            'keys': [('created_at', 1)],
+            'options': {'expireAfterSeconds': IDEMPOTENCY_KEY_TTL_SECONDS}
+        }
+    ]
+}
+
+META_COLLECTION = 'schema_migrations'
+META_ID = 'indexes'
+
+
+def _normalize_keys(keys):
+    """Normalize index key specs so server and declared values compare equal"""
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in keys]
+
+
+def _normalize_value(value):
+    """Convert SON/nested structures to plain dicts for comparison"""
+    if isinstance(value, dict):
+        return {k: _normalize_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize_value(v) for v in value]
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _matches(spec, existing):
+    """Check whether an existing index (from index_information) matches a spec"""
+    if _normalize_keys(existing.get('key', [])) != _normalize_keys(spec['keys']):
+        return False
+    for option in COMPARED_OPTIONS:
+        declared = spec['options'].get(option)
+        actual = existing.get(option)
+        if option in ('unique', 'sparse'):
+            declared, actual = bool(declared), bool(actual)
+        if _normalize_value(declared) != _normalize_value(actual):
+            return False
+    return True
+
+
+def check_drift(db):
+    """
+    Compare declared indexes with the live database.
+    Returns a dict keyed by collection with missing, mismatched and unmanaged index names.
+    """
+    report = {}
+    for collection_name, specs in INDEX_SPECS.items():
+        existing = db[collection_name].index_information()
+        declared_names = {spec['name'] for spec in specs}
+
+        missing = []
+        mismatched = []
+        for spec in specs:
+            if spec['name'] not in existing:
+                missing.append(spec['name'])
+            elif not _matches(spec, existing[spec['name']]):
+                mismatched.append(spec['name'])
+
+        unmanaged = [name for name in existing if name != '_id_' and name not in declared_names]
+
+        if missing or mismatched or unmanaged:
+            report[collection_name] = {
+                'missing': missing,
+                'mismatched': mismatched,
+                'unmanaged': unmanaged
+            }
+    return report
+
+
+def apply_indexes(db, drop_unmanaged=False):
+    """
+    Reconcile the database with INDEX_SPECS.
+    Creates missing indexes, rebuilds mismatched ones and optionally drops unmanaged ones.
+    Returns a list of errors (empty when everything was applied).
+    """
+    errors = []
+    drift = check_drift(db)
+
+    for collection_name, specs in INDEX_SPECS.items():
+        collection_drift = drift.get(collection_name)
+        if not collection_drift:
+            continue
+
+        collection = db[collection_name]
+        for spec in specs:
+            name = spec['name']
+            if name not in collection_drift['missing'] and name not in collection_drift['mismatched']:
+                continue
+            try:
+                if name in collection_drift['mismatched']:
+                    collection.drop_index(name)
+                collection.create_index(spec['keys'], name=name, **spec['options'])
+                logger.info(f'Created index {collection_name}.{name}')
+            except OperationFailure as e:
+                # e.g. duplicate order numbers already stored blocking a unique index
+                errors.append(f'{collection_name}.{name}: {e}')
+
+        if drop_unmanaged:
+            for name in collection_drift['unmanaged']:
+                collection.drop_index(name)
+                logger.info(f'Dropped unmanaged index {collection_name}.{name}')
+
+    return errors
+
+
+def _record_version(db):
+    """Store the applied INDEX_VERSION"""
+    db[META_COLLECTION].update_one(
+        {'_id': META_ID},
+        {'$set': {'version': INDEX_VERSION, 'applied_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def ensure_indexes(db):
+    """
+    Apply INDEX_SPECS once per INDEX_VERSION.
+    Called from Database.connect(); a single read when the database is already up to date.
+    """
+    meta = db[META_COLLECTION].find_one({'_id': META_ID})
+    if meta and meta.get('version', 0) >= INDEX_VERSION:
+        return True
+
+    errors = apply_indexes(db)
+    if errors:
+        for error in errors:
+            logger.error(f'Index bootstrap failed: {error}')
+        return False
+
+    _record_version(db)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage roastdirect database indexes')
+    parser.add_argument('--apply', action='store_true', help='create or rebuild declared indexes')
+    parser.add_argument('--drop-unmanaged', action='store_true',
+                        help='with --apply, also drop indexes that are not declared')
+    args = parser.parse_args(argv)
+
+    from db import Database
+    db = Database().connect(ensure_indexes=False)
+
+    if args.apply:
+        errors = apply_indexes(db, drop_unmanaged=args.drop_unmanaged)
+        if errors:
+            for error in errors:
+                print(f'ERROR {error}')
+            return 1
+        _record_version(db)
+
+    drift = check_drift(db)
+    meta = db[META_COLLECTION].find_one({'_id': META_ID}) or {}
+    print(f"Declared index version: {INDEX_VERSION}, applied: {meta.get('version', 'none')}")
+    if not drift:
+        print('No index drift detected')
+        return 0
+
+    for collection_name, details in drift.items():
+        for kind in ['missing', 'mismatched', 'unmanaged']:
+            for name in details[kind]:
+                print(f'{kind.upper():<10} {collection_name}.{name}')
+    # Unmanaged indexes alone are not treated as a failure
+    return 1 if any(d['missing'] or d['mismatched'] for d in drift.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
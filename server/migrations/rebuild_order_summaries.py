@@ -0,0 +1,75 @@
+"""
+Recompute every per-user order summary from the orders collection.
+
+The order write paths keep order_summaries up to date incrementally. This
+rebuild is for the initial rollout and for repairing drift. It runs as one
+aggregation that groups orders by user and status and folds the status
+counts into a single document per user. The results are written with $out
+into a fresh collection, which then replaces order_summaries in one rename,
+so summaries of users who no longer have orders disappear too:
+
+    python -m migrations.rebuild_order_summaries
+
+Orders written while the rebuild runs may be counted twice or not at all,
+so run it when order traffic is low.
+"""
+import sys
+from datetime import datetime
+
+from models.order_summary import OrderSummary
+
+# Staging collection the aggregation writes to before it replaces order_summaries
+REBUILD_COLLECTION = f'{OrderSummary.COLLECTION}_rebuild'
+
+
+def rebuild_pipeline(now):
+    return [
+        # One row per (user, status)
+        {'$group': {
+            '_id': {'user_id': '$user_id', 'status': '$status'},
+            'count': {'$sum': 1},
+            'spend': {'$sum': '$final_total'},
+            'last_order_at': {'$max': '$created_at'}
+        }},
+        # Fold the status rows into one summary per user
+        {'$group': {
+            '_id': '$_id.user_id',
+            'order_count': {'$sum': '$count'},
+            'lifetime_spend': {'$sum': {'$cond': [{'$eq': ['$_id.status', 'canceled']}, 0, '$spend']}},
+            'last_order_at': {'$max': '$last_order_at'},
+            'status_counts': {'$push': {'k': '$_id.status', 'v': '$count'}}
+        }},
+        # Only tracked statuses get a count, matching OrderSummary.record_status_change
+        {'$set': {
+            'status_counts': {'$arrayToObject': {'$filter': {
+                'input': '$status_counts',
+                'cond': {'$in': ['$$this.k', list(OrderSummary.TRACKED_STATUSES)]}
+            }}},
+            'updated_at': now
+        }},
+        {'$out': REBUILD_COLLECTION}
+    ]
+
+
+def rebuild(db):
+    """Rebuild all summaries; returns the number of summary documents afterwards"""
+    db.orders.aggregate(rebuild_pipeline(datetime.utcnow()), allowDiskUse=True)
+    if db[REBUILD_COLLECTION].estimated_document_count() == 0:
+        # No orders at all: nothing to swap in, so no user keeps a summary
+        db[REBUILD_COLLECTION].drop()
+        db[OrderSummary.COLLECTION].delete_many({})
+        return 0
+    db[REBUILD_COLLECTION].rename(OrderSummary.COLLECTION, dropTarget=True)
+    return db[OrderSummary.COLLECTION].count_documents({})
+
+
+def main():
+    from db import Database
+    db = Database().connect(ensure_indexes=False)
+    count = rebuild(db)
+    print(f'Rebuilt order summaries ({count} users)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
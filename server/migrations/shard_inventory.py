@@ -0,0 +1,108 @@
+"""
+Switch products between single-document and sharded inventory.
+
+Sharding moves a product's stock into N counters in `inventory_shards` (see
+models.inventory.InventoryShards), so concurrent checkouts of a hot product
+during a limited release stop conflicting on one document. Disabling folds
+the shards back into the product's inventory_count. Both run in a transaction.
+
+    python -m migrations.shard_inventory --enable <product_id> --shards 16
+    python -m migrations.shard_inventory --disable <product_id>
+    python -m migrations.shard_inventory --list
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+
+from models.inventory import InventoryShards
+
+DEFAULT_SHARDS = 16
+
+
+def enable_sharding(db, product_id, shard_count=DEFAULT_SHARDS):
+    """Split a product's stock across `shard_count` shard counters"""
+    if shard_count < 1:
+        raise ValueError('Shard count must be at least 1')
+
+    with db.client.start_session() as session:
+        with session.start_transaction():
+            product = db.products.find_one({'_id': product_id}, session=session)
+            if not product:
+                raise ValueError(f'Product {product_id} not found')
+            if InventoryShards.is_sharded(product):
+                raise ValueError(f'Product {product_id} already uses sharded inventory')
+
+            counts = InventoryShards.split(product['inventory_count'], shard_count)
+            db[InventoryShards.COLLECTION].insert_many([
+                {'product_id': product_id, 'shard': shard, 'count': count}
+                for shard, count in enumerate(counts)
+            ], session=session)
+            db.products.update_one(
+                {'_id': product_id},
+                {'$set': {
+                    'inventory_mode': InventoryShards.MODE,
+                    'inventory_shards': shard_count,
+                    'updated_at': datetime.utcnow()
+                }},
+                session=session
+            )
+    return sum(counts)
+
+
+def disable_sharding(db, product_id):
+    """Fold a product's shards back into its inventory_count"""
+    with db.client.start_session() as session:
+        with session.start_transaction():
+            product = db.products.find_one({'_id': product_id}, session=session)
+            if not product or not InventoryShards.is_sharded(product):
+                raise ValueError(f'Product {product_id} does not use sharded inventory')
+
+            shards = db[InventoryShards.COLLECTION].find({'product_id': product_id}, session=session)
+            total = sum(shard['count'] for shard in shards)
+            db.products.update_one(
+                {'_id': product_id},
+                {
+                    '$set': {'inventory_count': total, 'updated_at': datetime.utcnow()},
+                    '$unset': {'inventory_mode': '', 'inventory_shards': ''}
+                },
+                session=session
+            )
+            db[InventoryShards.COLLECTION].delete_many({'product_id': product_id}, session=session)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage sharded inventory for hot products')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--enable', metavar='PRODUCT_ID')
+    group.add_argument('--disable', metavar='PRODUCT_ID')
+    group.add_argument('--list', action='store_true', help='list products with sharded inventory')
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    args = parser.parse_args(argv)
+
+    from db import Database
+    db = Database().connect(ensure_indexes=False)
+
+    try:
+        if args.list:
+            products = list(db.products.find({'inventory_mode': InventoryShards.MODE}, {'name': 1, 'inventory_count': 1, 'inventory_mode': 1}))
+            InventoryShards.apply_totals(products)
+            for product in products:
+                print(f"{product['_id']}  {product['name']}: {product['inventory_count']} in stock")
+            return 0
+        if args.enable:
+            total = enable_sharding(db, ObjectId(args.enable), args.shards)
+            print(f'Sharded {total} units of {args.enable} across {args.shards} counters')
+        else:
+            total = disable_sharding(db, ObjectId(args.disable))
+            print(f'Folded {total} units back into {args.disable}')
+    except ValueError as e:
+        print(f'ERROR {e}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import random
+from pymongo import ReturnDocument
+from db import get_database
+
+class InventoryShards:
+    """
+    Sharded stock counters for hot products.
+
+    A product with inventory_mode 'sharded' keeps its stock in `inventory_shards`
+    documents ({product_id, shard, count}, one per shard) instead of its own
+    inventory_count, so concurrent checkouts of the same product update different
+    documents and stop conflicting with each other. Reservations pick a random shard
+    and fall back to the others; reads present the sum of the shards as the product's
+    inventory_count.
+
+    The product document's own inventory_count stays the in-stock marker that the catalog
+    query and its partial indexes filter on: it is reset to the shard total whenever a
+    reservation empties a shard and raised by every restore, so it is 0 exactly when all
+    shards are empty. Only those writes touch the product document, which also makes a
+    sell-out conflict with a concurrent sell-out or restore instead of racing it;
+    ordinary reservations touch only their shard.
+
+    Enable or disable with `python -m migrations.shard_inventory`.
+    """
+
+    COLLECTION = 'inventory_shards'
+    MODE = 'sharded'
+
+    @staticmethod
+    def is_sharded(product):
+        return product.get('inventory_mode') == InventoryShards.MODE
+
+    @staticmethod
+    def split(total, shard_count):
+        """Spread `total` units as evenly as possible over `shard_count` shards"""
+        base, remainder = divmod(total, shard_count)
+        return [base + (1 if shard < remainder else 0) for shard in range(shard_count)]
+
+    @staticmethod
+    def _totals_pipeline(product_ids):
+        return [
+            {'$match': {'product_id': {'$in': list(product_ids)}}},
+            {'$group': {'_id': '$product_id', 'count': {'$sum': '$count'}}}
+        ]
+
+    @staticmethod
+    def _sharded_ids(products):
+        return {
+            product['_id'] for product in products
+            if InventoryShards.is_sharded(product) and 'inventory_count' in product
+        }
+
+    @staticmethod
+    def apply_totals(products, session=None):
+        """Replace inventory_count on sharded products with the sum of their shards (one query)"""
+        product_ids = InventoryShards._sharded_ids(products)
+        if not product_ids:
+            return products
+
+        db = get_database()
+        totals = {
+            row['_id']: row['count']
+            for row in db[InventoryShards.COLLECTION].aggregate(InventoryShards._totals_pipeline(product_ids), session=session)
+        }
+        for product in products:
+            if product['_id'] in product_ids:
+                product['inventory_count'] = totals.get(product['_id'], 0)
+        return products
+
+    @staticmethod
+    def _take(collection, product_id, shard, quantity, session):
+        """Take from one shard; returns what is left in it, or None when it holds too little"""
+        shard_doc = collection.find_one_and_update(
+            {'product_id': product_id, 'shard': shard, 'count': {'$gte': quantity}},
+            {'$inc': {'count': -quantity}},
+            projection={'count': 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        return shard_doc['count'] if shard_doc else None
+
+    @staticmethod
+    def _refresh_stock_marker(product_id, session):
+        """Set the product's inventory_count to its shard total (after a shard ran empty)"""
+        db = get_database()
+        rows = list(db[InventoryShards.COLLECTION].aggregate(InventoryShards._totals_pipeline([product_id]), session=session))
+        db.products.update_one(
+            {'_id': product_id},
+            {'$set': {'inventory_count': rows[0]['count'] if rows else 0}},
+            session=session
+        )
+
+    @staticmethod
+    def _took(product_id, left, session):
+        if left == 0:
+            InventoryShards._refresh_stock_marker(product_id, session)
+        return True
+
+    @staticmethod
+    def reserve(product_id, quantity, shard_count, session=None):
+        """
+        Take `quantity` units from a product's shards. Returns False when the shards together
+        do not hold enough; run inside the order transaction so partial takes are rolled back.
+        """
+        collection = get_database()[InventoryShards.COLLECTION]
+
+        # Common case: one random shard covers the whole quantity
+        first = random.randrange(shard_count)
+        left = InventoryShards._take(collection, product_id, first, quantity, session)
+        if left is not None:
+            return InventoryShards._took(product_id, left, session)
+
+        # Fallback: fullest shard that covers it, otherwise combine shards
+        shards = list(collection.find({'product_id': product_id}, {'shard': 1, 'count': 1}, session=session).sort('count', -1))
+        if sum(shard['count'] for shard in shards) < quantity:
+            return False
+        for shard in shards:
+            if shard['shard'] != first and shard['count'] >= quantity:
+                left = InventoryShards._take(collection, product_id, shard['shard'], quantity, session)
+                if left is not None:
+                    return InventoryShards._took(product_id, left, session)
+                break
+
+        # Combining shards always empties at least one of them
+        remaining = quantity
+        for shard in shards:
+            take = min(shard['count'], remaining)
+            if take <= 0:
+                continue
+            if InventoryShards._take(collection, product_id, shard['shard'], take, session) is None:
+                return False
+            remaining -= take
+            if remaining == 0:
+                return InventoryShards._took(product_id, 0, session)
+        return False
+
+    @staticmethod
+    def restore(product_id, quantity, shard_count, session=None):
+        """Return `quantity` units to a random shard (e.g. when an order is canceled)"""
+        db = get_database()
+        db[InventoryShards.COLLECTION].update_one(
+            {'product_id': product_id, 'shard': random.randrange(shard_count)},
+            {'$inc': {'count': quantity}},
+            session=session
+        )
+        # Back in stock for the catalog query, even if it had sold out
+        db.products.update_one({'_id': product_id}, {'$inc': {'inventory_count': quantity}}, session=session)
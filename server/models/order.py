@@ -1,13 +1,20 @@
 from datetime import datetime
 from bson import ObjectId
-import uuid
 import random
+from models.order_number import order_numbers
+
+# Product fields copied onto each order item when the order is placed
+ORDER_ITEM_SNAPSHOT_FIELDS = ('name', 'image_url', 'roast_level')
+
+# Snapshot for items whose product was deleted before it could be snapshotted; readers treat
+# it like a missing product so the responses keep their "no longer available" fallbacks
+UNKNOWN_PRODUCT_SNAPSHOT = {'name': 'Unknown Product', 'image_url': '', 'roast_level': '', 'product_deleted': True}
 
 class Order:
     def __init__(self, user_id, items, shipping_address, billing_address=None, payment_info=None, final_total=0):
         self.user_id = ObjectId(user_id)
         self.order_number = self.generate_order_number()
-        self.items = items  # Array of {product_id, quantity, grind_option, price_at_time}
+        self.items = items  # Array of {product_id, quantity, grind_option, price_at_time, product_snapshot}
         self.shipping_address = shipping_address
         self.billing_address = billing_address  # Excluded for MVP purposes
         self.payment_info = payment_info  # Excluded for MVP purposes
@@ -18,12 +25,15 @@ class Order:
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
     
+    @staticmethod
+    def product_snapshot(product):
+        """Product details stored on an order item, so history reads never need the products collection"""
+        return {field: product.get(field, '') for field in ORDER_ITEM_SNAPSHOT_FIELDS}
+    
     @staticmethod
     def generate_order_number():
-        """Generate unique order number for customer reference"""
-        date_str = datetime.utcnow().strftime('%Y%m%d')
-        random_suffix = str(uuid.uuid4())[:4].upper()
-        return f"RD-{date_str}-{random_suffix}"
+        """Generate unique order number for customer reference (see models.order_number)"""
+        return order_numbers.next_number()
     
     def to_dict(self):
         """Convert order object to dictionary for MongoDB"""
@@ -0,0 +1,87 @@
+import os
+import threading
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db import get_database
+
+# Sequence numbers leased from the counters collection per round trip
+ORDER_NUMBER_BLOCK_SIZE = int(os.getenv('ORDER_NUMBER_BLOCK_SIZE', 100))
+
+BASE36_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# Fixed width keeps numbers of the same day sorting in sequence order (36**7 ~ 78 billion)
+SEQUENCE_WIDTH = 7
+
+
+def to_base36(value, width=SEQUENCE_WIDTH):
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(BASE36_DIGITS[remainder])
+    return ''.join(reversed(digits)).rjust(width, '0')
+
+
+class OrderNumberAllocator:
+    """
+    Hands out order numbers like RD-20250101-000004F from one global sequence.
+
+    Each process leases a block of ORDER_NUMBER_BLOCK_SIZE sequence numbers from the
+    `counters` collection with a single find_one_and_update and serves numbers from
+    it under a lock, so only one order per block pays a round trip. Leased blocks
+    never overlap, which makes numbers unique across threads, workers and hosts
+    (enforced by the order_number_unique index). Numbers left in a block when a
+    process exits are skipped, so the sequence can have gaps. The lease runs outside
+    the order transaction: an aborted order burns its number instead of rolling the
+    counter back, and concurrent checkouts never conflict on the counter document.
+    """
+
+    COLLECTION = 'counters'
+
+    def __init__(self, name, block_size=None):
+        self.name = name
+        self.block_size = block_size or ORDER_NUMBER_BLOCK_SIZE
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = None
+        self.leases = 0
+
+    def _lease(self):
+        """Reserve the next block; returns its first sequence number"""
+        collection = get_database()[self.COLLECTION]
+        try:
+            counter = collection.find_one_and_update(
+                {'_id': self.name},
+                {'$inc': {'seq': self.block_size}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two first-ever leases raced on the upsert; the counter exists now
+            counter = collection.find_one_and_update(
+                {'_id': self.name},
+                {'$inc': {'seq': self.block_size}},
+                return_document=ReturnDocument.AFTER
+            )
+        self.leases += 1
+        return counter['seq'] - self.block_size + 1
+
+    def next_sequence(self):
+        with self._lock:
+            # A forked worker must not serve the rest of its parent's block
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._pid = os.getpid()
+                self._next = self._lease()
+                self._end = self._next + self.block_size
+            sequence = self._next
+            self._next += 1
+            return sequence
+
+    def next_number(self):
+        date_str = datetime.utcnow().strftime('%Y%m%d')
+        return f"RD-{date_str}-{to_base36(self.next_sequence())}"
+
+
+order_numbers = OrderNumberAllocator('order_number')
@@ -0,0 +1,69 @@
+from datetime import datetime
+from bson import ObjectId
+from db import get_database
+
+class OrderSummary:
+    """
+    Per-user order totals in the `order_summaries` collection, keyed by user id.
+    Kept up to date by the order write paths inside their transactions and
+    rebuilt from scratch with `python -m migrations.rebuild_order_summaries`.
+
+    Document shape:
+        {_id: user_id, order_count, lifetime_spend, last_order_at,
+         status_counts: {'in-progress': n, 'delivered': n, 'canceled': n}, updated_at}
+    lifetime_spend excludes canceled orders. Only the statuses in TRACKED_STATUSES are
+    counted; legacy statuses such as 'processing' count towards order_count only.
+    """
+
+    COLLECTION = 'order_summaries'
+    TRACKED_STATUSES = ('in-progress', 'delivered', 'canceled')
+
+    @staticmethod
+    def record_placed(user_id, final_total, created_at, session=None):
+        """Count a newly placed (in-progress) order"""
+        db = get_database()
+        db[OrderSummary.COLLECTION].update_one(
+            {'_id': ObjectId(user_id)},
+            {
+                '$inc': {'order_count': 1, 'lifetime_spend': final_total, 'status_counts.in-progress': 1},
+                '$max': {'last_order_at': created_at},
+                '$set': {'updated_at': datetime.utcnow()}
+            },
+            upsert=True,
+            session=session
+        )
+
+    @staticmethod
+    def record_status_change(user_id, old_status, new_status, final_total, session=None):
+        """Move an order between status counts; canceling also takes it out of lifetime spend"""
+        increments = {
+            f'status_counts.{status}': step
+            for status, step in [(old_status, -1), (new_status, 1)]
+            if status in OrderSummary.TRACKED_STATUSES
+        }
+        if new_status == 'canceled':
+            increments['lifetime_spend'] = -final_total
+
+        db = get_database()
+        db[OrderSummary.COLLECTION].update_one(
+            {'_id': ObjectId(user_id)},
+            {'$inc': increments, '$set': {'updated_at': datetime.utcnow()}},
+            session=session
+        )
+
+    @staticmethod
+    def to_response(summary):
+        """API representation of a summary document (zeros for users without orders)"""
+        summary = summary or {}
+        return {
+            'order_count': summary.get('order_count', 0),
+            'lifetime_spend': round(summary.get('lifetime_spend', 0), 2),
+            'last_order_at': summary.get('last_order_at'),
+            'status_counts': summary.get('status_counts', {})
+        }
+
+    @staticmethod
+    def find_by_user(user_id):
+        db = get_database()
+        return db[OrderSummary.COLLECTION].find_one({'_id': ObjectId(user_id)})
+
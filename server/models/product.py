@@ -1,4 +1,8 @@
 from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from db import get_database
+from models.inventory import InventoryShards
 
 class Product:
     def __init__(self, name, description, price, roast_level, origin_country, elevation,
@@ -34,4 +38,117 @@ class Product:
             'created_at': self.created_at,
             'updated_at': self.updated_at,
             'is_active': self.is_active
-        }
\ No newline at end of file
+        }
+    
+    @staticmethod
+    def find_by_ids(product_ids, projection=None, active_only=False, session=None):
+        """Fetch many products in a single $in query, returned as a dict keyed by _id"""
+        unique_ids = list(dict.fromkeys(product_ids))
+        if not unique_ids:
+            return {}
+        
+        query = {'_id': {'$in': unique_ids}}
+        if active_only:
+            query['is_active'] = True
+        
+        db = get_database()
+        products = InventoryShards.apply_totals(list(db.products.find(query, projection, session=session)), session=session)
+        return {product['_id']: product for product in products}
+    
+    @staticmethod
+    def inventory_layout(product_ids, active_only=True, session=None):
+        """
+        Maps every product among product_ids that exists (and is active, with active_only) to its
+        shard count, or to None when it keeps a single inventory_count. Missing ids are left out.
+        """
+        query = {'_id': {'$in': list(dict.fromkeys(product_ids))}}
+        if active_only:
+            query['is_active'] = True
+        
+        db = get_database()
+        products = db.products.find(query, {'inventory_mode': 1, 'inventory_shards': 1}, session=session)
+        return {
+            product['_id']: product['inventory_shards'] if InventoryShards.is_sharded(product) else None
+            for product in products
+        }
+    
+    @staticmethod
+    def reserve_inventory(reservations, session=None, sharded=None):
+        """
+        Decrement inventory for a list of (product_id, quantity) pairs: one ordered bulk_write for
+        regular products, shard counters for sharded ones (see InventoryShards).
+        `sharded` maps sharded product ids to their shard count. Only callers that already read every
+        product in the same session may pass it; otherwise the products are looked up here and a
+        product that no longer exists or is inactive fails its reservation.
+        Returns None when every reservation succeeded, otherwise the index of the first one that failed.
+        """
+        if not reservations:
+            return None
+        
+        if sharded is None:
+            layout = Product.inventory_layout([product_id for product_id, _ in reservations], session=session)
+            for index, (product_id, _) in enumerate(reservations):
+                # Checked before writing: the upsert below would otherwise create a phantom product
+                if product_id not in layout:
+                    return index
+            sharded = {product_id: shards for product_id, shards in layout.items() if shards}
+        regular = [(index, reservation) for index, reservation in enumerate(reservations) if reservation[0] not in sharded]
+        
+        # Each update is an upsert keyed on _id: when the stock condition no longer matches,
+        # the upsert collides with the existing _id and the ordered bulk stops with a
+        # duplicate key error whose index identifies the failed reservation. Products that
+        # switched to sharded inventory fail the same way instead of decrementing the wrong counter.
+        if regular:
+            operations = [
+                UpdateOne(
+                    {
+                        '_id': product_id,
+                        'is_active': True,
+                        'inventory_mode': {'$ne': InventoryShards.MODE},
+                        'inventory_count': {'$gte': quantity}
+                    },
+                    {'$inc': {'inventory_count': -quantity}},
+                    upsert=True
+                )
+                for _, (product_id, quantity) in regular
+            ]
+            
+            db = get_database()
+            try:
+                db.products.bulk_write(operations, ordered=True, session=session)
+            except BulkWriteError as e:
+                write_errors = e.details.get('writeErrors', [])
+                if not write_errors or write_errors[0].get('code') != 11000:
+                    raise
+                # The write error aborted the server-side transaction, so nothing else may be sent
+                # on this session (shard reservations would fail as transient and be retried in vain)
+                return regular[write_errors[0]['index']][0]
+        
+        for index, (product_id, quantity) in enumerate(reservations):
+            if product_id in sharded and not InventoryShards.reserve(product_id, quantity, sharded[product_id], session=session):
+                return index
+        return None
+    
+    @staticmethod
+    def restore_inventory(restorations, session=None):
+        """Add (product_id, quantity) pairs back to inventory, e.g. when an order is canceled"""
+        if not restorations:
+            return
+        
+        layout = Product.inventory_layout([product_id for product_id, _ in restorations], active_only=False, session=session)
+        sharded = {product_id: shards for product_id, shards in layout.items() if shards}
+        operations = [
+            UpdateOne(
+                {'_id': product_id, 'inventory_mode': {'$ne': InventoryShards.MODE}},
+                {'$inc': {'inventory_count': quantity}}
+            )
+            for product_id, quantity in restorations
+            if product_id not in sharded
+        ]
+        
+        db = get_database()
+        if operations:
+            db.products.bulk_write(operations, ordered=True, session=session)
+        for product_id, quantity in restorations:
+            if product_id in sharded:
+                InventoryShards.restore(product_id, quantity, sharded[product_id], session=session)
\ No newline at end of file
@@ -33,4 +33,13 @@ class User:
         """Create new user in database"""
         db = get_database()
         result = db.users.insert_one(user_data)
-        return result.inserted_id
\ No newline at end of file
+        return result.inserted_id
+    
+    @staticmethod
+    def update_password(user_id, hashed_password):
+        """Replace a user's stored password hash"""
+        db = get_database()
+        db.users.update_one(
+            {'_id': user_id},
+            {'$set': {'password': hashed_password, 'updated_at': datetime.utcnow()}}
+        )
\ No newline at end of file
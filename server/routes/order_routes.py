@@ -6,6 +6,7 @@ from controllers.order_controller import (
     place_order,
     get_all_orders,
     get_order_by_id,
+    get_order_summary,
     cancel_order,
     mark_as_delivered
 )
@@ -36,6 +37,12 @@ def get_all_orders_route():
     """Get all orders for the current user"""
     return get_all_orders()
 
+@orders_bp.route('/summary', methods=['GET'])
+@auth_required
+def get_order_summary_route():
+    """Get order totals for the current user"""
+    return get_order_summary()
+
 @orders_bp.route('/<order_id>', methods=['GET'])
 @auth_required
 def get_order_by_id_route(order_id):
@@ -1,9 +1,19 @@
-from flask import Blueprint
+from flask import Blueprint, request
+import os
 from controllers.product_controller import add_product, get_all_products, get_product_by_id
 from middlewares.auth_middleware import auth_required
 
 products_bp = Blueprint('products', __name__, url_prefix='/api/products')
 
+# Cache-Control sent with catalog reads (successful and 304 responses)
+PRODUCTS_CACHE_CONTROL = os.getenv('PRODUCTS_CACHE_CONTROL', 'public, max-age=60')
+
+@products_bp.after_request
+def set_cache_control(response):
+    if request.method == 'GET' and response.status_code in (200, 304) and PRODUCTS_CACHE_CONTROL:
+        response.headers.setdefault('Cache-Control', PRODUCTS_CACHE_CONTROL)
+    return response
+
 @products_bp.route('/add_product', methods=['POST'])
 @auth_required
 def add_product_route():
@@ -17,4 +27,4 @@ def get_all_products_route():
 
 @products_bp.route('/<string:product_id>', methods=['GET'])
 def get_product_by_id_route(product_id):
-    return get_product_by_id(product_id)
\ No newline at end of file
+    return get_product_by_id(product_id)
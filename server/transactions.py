@@ -0,0 +1,187 @@
+"""
+Transactional units of work with bounded retries.
+
+run_transaction(name, body) runs body(session) inside a MongoDB transaction
+and commits it. When the server labels an error as retryable, the work is
+retried:
+
+- TransientTransactionError (e.g. a write conflict with a concurrent
+  checkout): the whole body runs again after a jittered exponential backoff.
+- UnknownTransactionCommitResult: only the commit is retried, with the same
+  backoff, since committing is idempotent.
+
+Body runs and commits are each limited to TRANSACTION_MAX_ATTEMPTS attempts,
+and retries stop once TRANSACTION_DEADLINE_SECONDS have passed; then
+TransactionConflict is raised so callers can answer 503 instead of 500.
+Bodies may run more than once, so they must not have side effects outside
+the session. To end the transaction early with a response (validation
+errors, insufficient stock), a body raises AbortTransaction(response); the
+transaction is aborted and the exception re-raised for the caller to return
+its response.
+
+Counters per unit name (attempts, retries, aborts, conflicts, commit latency)
+are exposed under `transactions` in /api/metrics.
+"""
+import os
+import random
+import threading
+import time
+
+from pymongo.errors import PyMongoError
+
+import metrics
+from db import get_database
+
+TRANSACTION_MAX_ATTEMPTS = int(os.getenv('TRANSACTION_MAX_ATTEMPTS', 5))
+TRANSACTION_DEADLINE_SECONDS = float(os.getenv('TRANSACTION_DEADLINE_SECONDS', 5))
+TRANSACTION_BACKOFF_BASE_MS = float(os.getenv('TRANSACTION_BACKOFF_BASE_MS', 10))
+TRANSACTION_BACKOFF_MAX_MS = float(os.getenv('TRANSACTION_BACKOFF_MAX_MS', 250))
+
+TRANSIENT_ERROR = 'TransientTransactionError'
+UNKNOWN_COMMIT_RESULT = 'UnknownTransactionCommitResult'
+
+
+class AbortTransaction(Exception):
+    """Raised by a transaction body to abort the transaction and return `response`"""
+
+    def __init__(self, response):
+        super().__init__('Transaction aborted')
+        self.response = response
+
+
+class TransactionConflict(Exception):
+    """Raised when a transaction still fails with retryable errors after every allowed attempt"""
+
+
+class TransactionStats:
+    """Counters for each named transactional unit"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._units = {}
+
+    def _unit(self, name):
+        unit = self._units.get(name)
+        if unit is None:
+            unit = self._units[name] = {
+                'runs': 0,
+                'committed': 0,
+                'attempts': 0,
+                'retries': 0,
+                'commit_retries': 0,
+                'aborted': 0,
+                'conflicts': 0,
+                'errors': 0,
+                'commit_ms_total': 0.0,
+                'commit_ms_max': 0.0
+            }
+        return unit
+
+    def increment(self, name, counter, amount=1):
+        with self._lock:
+            self._unit(name)[counter] += amount
+
+    def record_commit(self, name, commit_ms):
+        with self._lock:
+            unit = self._unit(name)
+            unit['committed'] += 1
+            unit['commit_ms_total'] += commit_ms
+            unit['commit_ms_max'] = max(unit['commit_ms_max'], commit_ms)
+
+    def snapshot(self):
+        with self._lock:
+            report = {}
+            for name, unit in self._units.items():
+                committed = unit['committed']
+                report[name] = {
+                    key: value for key, value in unit.items() if not key.startswith('commit_ms')
+                }
+                report[name]['commit_ms_avg'] = round(unit['commit_ms_total'] / committed, 3) if committed else 0.0
+                report[name]['commit_ms_max'] = round(unit['commit_ms_max'], 3)
+            return report
+
+
+transaction_stats = TransactionStats()
+metrics.register('transactions', transaction_stats.snapshot)
+
+
+def _backoff(attempt, deadline):
+    """Sleep with full jitter before the next attempt; False when the deadline leaves no room"""
+    ceiling_ms = min(TRANSACTION_BACKOFF_MAX_MS, TRANSACTION_BACKOFF_BASE_MS * 2 ** (attempt - 1))
+    delay = random.uniform(0, ceiling_ms) / 1000
+    if time.monotonic() + delay >= deadline:
+        return False
+    time.sleep(delay)
+    return True
+
+
+def _abort(session):
+    if session.in_transaction:
+        try:
+            session.abort_transaction()
+        except PyMongoError:
+            # The server discards the transaction on its own; nothing else to clean up
+            pass
+
+
+def _commit(name, session, max_attempts, deadline):
+    """
+    Commit, retrying with backoff while the outcome is unknown (bounded like the body retries);
+    raises the last error otherwise
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        started = time.perf_counter()
+        try:
+            session.commit_transaction()
+        except PyMongoError as e:
+            if e.has_error_label(UNKNOWN_COMMIT_RESULT) and attempt < max_attempts and _backoff(attempt, deadline):
+                transaction_stats.increment(name, 'commit_retries')
+                continue
+            raise
+        transaction_stats.record_commit(name, (time.perf_counter() - started) * 1000)
+        return
+
+
+def run_transaction(name, body, max_attempts=None, deadline_seconds=None):
+    """
+    Run body(session) in a transaction and commit it, retrying on transient errors.
+    Returns the body's result. AbortTransaction raised by the body propagates after the abort.
+    """
+    max_attempts = max_attempts or TRANSACTION_MAX_ATTEMPTS
+    deadline = time.monotonic() + (deadline_seconds or TRANSACTION_DEADLINE_SECONDS)
+    client = get_database().client
+    transaction_stats.increment(name, 'runs')
+
+    attempt = 0
+    while True:
+        attempt += 1
+        transaction_stats.increment(name, 'attempts')
+        with client.start_session() as session:
+            session.start_transaction()
+            try:
+                result = body(session)
+                _commit(name, session, max_attempts, deadline)
+                return result
+            except AbortTransaction:
+                _abort(session)
+                transaction_stats.increment(name, 'aborted')
+                raise
+            except PyMongoError as e:
+                _abort(session)
+                if e.has_error_label(UNKNOWN_COMMIT_RESULT) and not e.has_error_label(TRANSIENT_ERROR):
+                    # The commit may have been applied, so running the body again could repeat it
+                    transaction_stats.increment(name, 'conflicts')
+                    raise TransactionConflict(f'{name} commit outcome unknown after retries') from e
+                if not e.has_error_label(TRANSIENT_ERROR):
+                    transaction_stats.increment(name, 'errors')
+                    raise
+                if attempt >= max_attempts or not _backoff(attempt, deadline):
+                    transaction_stats.increment(name, 'conflicts')
+                    raise TransactionConflict(f'{name} did not commit after {attempt} attempts') from e
+                transaction_stats.increment(name, 'retries')
+            except Exception:
+                _abort(session)
+                transaction_stats.increment(name, 'errors')
+                raise
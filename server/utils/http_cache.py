@@ -0,0 +1,52 @@
+"""
+HTTP caching helpers: pre-serialized JSON bodies with strong ETags.
+
+A PreparedBody is serialized once and can be stored in the catalog cache, so
+a conditional GET that matches its ETag is answered with 304 without
+serializing anything or querying MongoDB. Compressed variants are built the
+first time an encoding is requested and kept on the PreparedBody, each with
+its own ETag.
+"""
+import hashlib
+import threading
+
+from flask import Response, current_app, request
+
+from middlewares.compression import add_vary, compress, negotiate_encoding
+
+
+class PreparedBody:
+    """A JSON payload serialized to bytes together with its strong ETag"""
+    
+    def __init__(self, payload):
+        self.body = current_app.json.dumps(payload).encode('utf-8') + b'\n'
+        self.etag = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self._encoded = {}
+        self._lock = threading.Lock()
+    
+    def variant(self, encoding):
+        """Return (body, etag) for an encoding, compressing at most once per encoding"""
+        if encoding is None:
+            return self.body, self.etag
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            with self._lock:
+                encoded = self._encoded.get(encoding)
+                if encoded is None:
+                    encoded = self._encoded[encoding] = compress(self.body, encoding)
+        return encoded, f'{self.etag}-{encoding}'
+
+
+def prepared_response(prepared, status=200):
+    """Return the prepared body, or 304 Not Modified when If-None-Match matches its ETag"""
+    encoding = negotiate_encoding(len(prepared.body))
+    body, etag = prepared.variant(encoding)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, status=status, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    add_vary(response)
+    return response
@@ -0,0 +1,134 @@
+"""
+Idempotency keys for place_order.
+
+A client that sends `Idempotency-Key: <key>` can safely retry a request that
+timed out. The key is inserted into `idempotency_keys` first thing inside
+the order transaction and the response is stored with it, so the key
+commits only together with the order:
+
+- A retry after the commit finds the key before starting a transaction and
+  gets the stored response back (Idempotent-Replayed: true), without
+  touching inventory.
+- A duplicate that arrives while the first request is still in flight
+  collides with its uncommitted key (a write conflict). Instead of leaving
+  that to run_transaction's short conflict backoff, the duplicate aborts its
+  transaction and polls for the stored response for up to
+  IDEMPOTENCY_WAIT_MS, then replays it. If the first request has not
+  committed by then, the duplicate gets 409 with Retry-After.
+- Reusing a key with a different request body is rejected with 422.
+
+Failed attempts (e.g. out of stock) roll the key back with the rest of the
+transaction, so they can be retried with the same key. Keys are scoped to
+the user and expire after IDEMPOTENCY_KEY_TTL_SECONDS (TTL index declared in
+migrations/indexes.py).
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from flask import jsonify
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from db import get_database
+from transactions import AbortTransaction
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+COLLECTION = 'idempotency_keys'
+WRITE_CONFLICT = 112
+
+# How long a duplicate waits for an in-flight request with the same key to commit
+IDEMPOTENCY_WAIT_MS = float(os.getenv('IDEMPOTENCY_WAIT_MS', 3000))
+IDEMPOTENCY_POLL_MS = float(os.getenv('IDEMPOTENCY_POLL_MS', 50))
+
+
+def request_fingerprint(data):
+    """Stable hash of a JSON request body, used to detect a key reused for a different request"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class IdempotentRequest:
+    """One request carrying an Idempotency-Key, scoped to the user that sent it"""
+
+    def __init__(self, user_id, key, data):
+        self.record_id = f'{user_id}:{key}'
+        self.fingerprint = request_fingerprint(data)
+
+    @staticmethod
+    def from_request(request, user_id, data):
+        """None when the header is absent; raises ValueError when it is empty or too long"""
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return None
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValueError(f'{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters')
+        return IdempotentRequest(user_id, key, data)
+
+    def _replay(self, record):
+        if record['request_hash'] != self.fingerprint:
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422
+        response = jsonify(record['response_body'])
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response, record['response_status']
+
+    def stored_response(self):
+        """The response stored for this key by a committed request, or None"""
+        db = get_database()
+        record = db[COLLECTION].find_one({'_id': self.record_id})
+        if record is None or 'response_body' not in record:
+            return None
+        return self._replay(record)
+
+    def wait_for_response(self):
+        """
+        Poll for the response of an in-flight request with this key. Returns it once
+        committed, or 409 when it is still running after IDEMPOTENCY_WAIT_MS.
+        """
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_MS / 1000
+        while True:
+            response = self.stored_response()
+            if response is not None:
+                return response
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(IDEMPOTENCY_POLL_MS / 1000)
+        response = jsonify({'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+
+    def claim(self, session):
+        """
+        Insert the key inside the caller's transaction. When another request committed
+        the key in the meantime, abort with that request's response instead; when another
+        request holds it uncommitted, abort and wait for that request's response.
+        """
+        db = get_database()
+        try:
+            db[COLLECTION].insert_one({
+                '_id': self.record_id,
+                'request_hash': self.fingerprint,
+                'created_at': datetime.utcnow()
+            }, session=session)
+        except DuplicateKeyError:
+            response = self.stored_response()
+            if response is None:
+                raise
+            raise AbortTransaction(response)
+        except OperationFailure as e:
+            if e.code != WRITE_CONFLICT:
+                raise
+            # Another request holds the key uncommitted; other transient errors keep the normal retries
+            raise AbortTransaction(self.wait_for_response())
+
+    def store(self, status, body, session):
+        """Attach the response to the claimed key; commits with the rest of the transaction"""
+        db = get_database()
+        db[COLLECTION].update_one(
+            {'_id': self.record_id},
+            {'$set': {'response_status': status, 'response_body': body}},
+            session=session
+        )
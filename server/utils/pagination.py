@@ -0,0 +1,61 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe encoding of the sort key values of the last
+item on a page. The next page continues strictly after that item, so pages
+stay stable while new documents are inserted and no documents are skipped
+with an offset.
+"""
+import base64
+
+from bson import json_util
+
+
+def encode_cursor(values):
+    """Encode the sort key values of the last returned item into an opaque cursor"""
+    raw = json_util.dumps(list(values)).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, expected_length):
+    """Decode a cursor back into sort key values. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def parse_page_size(raw_value, default, maximum):
+    """Parse a ?limit= value, falling back to the default and capping at the maximum"""
+    if raw_value is None or raw_value == '':
+        return default
+    try:
+        page_size = int(raw_value)
+    except (ValueError, TypeError):
+        raise ValueError('Limit must be an integer')
+    if page_size <= 0:
+        raise ValueError('Limit must be positive')
+    return min(page_size, maximum)
+
+
+def keyset_filter(sort, values):
+    """
+    Build the query that selects documents strictly after `values` in `sort` order.
+    `sort` is a list of (field, direction) pairs, e.g. [('created_at', -1), ('_id', -1)].
+    """
+    clauses = []
+    for position, (field, direction) in enumerate(sort):
+        clause = {prev_field: values[i] for i, (prev_field, _) in enumerate(sort[:position])}
+        clause[field] = {'$lt' if direction < 0 else '$gt': values[position]}
+        clauses.append(clause)
+    return {'$or': clauses}
+
+
+def sort_values(document, sort):
+    """Extract the sort key values of a document, used to build the next cursor"""
+    return [document[field] for field, _ in sort]
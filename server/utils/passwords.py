@@ -0,0 +1,95 @@
+"""
+Password hashing on a dedicated, bounded bcrypt worker pool.
+
+bcrypt is deliberately slow, so hashing runs on its own small thread pool
+instead of the request thread (bcrypt releases the GIL while it works).
+At most PASSWORD_HASH_WORKERS hashes run at once and at most
+PASSWORD_HASH_QUEUE_SIZE more wait for a worker. A request that cannot get
+a slot within PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS raises PasswordHasherBusy,
+which the auth controller turns into a 503, so login bursts cannot starve
+the rest of the API.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+import metrics
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 16))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS', 2))
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full and no slot frees up in time"""
+
+
+# Worker threads are created lazily on first use, so forked workers get their own
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE)
+
+_stats_lock = threading.Lock()
+_stats = {'in_flight': 0, 'completed': 0, 'rejected': 0, 'rehashed': 0}
+
+
+def _count(name, delta=1):
+    with _stats_lock:
+        _stats[name] += delta
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats, workers=PASSWORD_HASH_WORKERS, queue_size=PASSWORD_HASH_QUEUE_SIZE,
+                    rounds=BCRYPT_ROUNDS)
+
+
+metrics.register('password_hashing', stats)
+
+
+def _release(future):
+    _count('in_flight', -1)
+    _count('completed')
+    _slots.release()
+
+
+def _run(fn, *args):
+    """Run fn on the bcrypt pool and wait for its result"""
+    if not _slots.acquire(timeout=PASSWORD_HASH_QUEUE_TIMEOUT):
+        _count('rejected')
+        raise PasswordHasherBusy()
+    
+    _count('in_flight')
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _count('in_flight', -1)
+        _slots.release()
+        raise
+    future.add_done_callback(_release)
+    return future.result()
+
+
+def hash_password(password):
+    """Hash a plain-text password with the configured cost factor"""
+    hashed = _run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+    return hashed.decode('utf-8')
+
+
+def check_password(password, hashed_password):
+    """Check a plain-text password against a stored bcrypt hash"""
+    return _run(bcrypt.checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def needs_rehash(hashed_password):
+    """True when a stored hash was made with a different cost factor than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+def record_rehash():
+    _count('rehashed')
@@ -0,0 +1,57 @@
+"""
+Signed cart quotes.
+
+calculate_subtotal prices the cart and returns a quote: a compact, signed,
+expiring token holding the priced items. calculate_final_total accepts it
+in place of a client-supplied subtotal and returns a final quote that also
+locks in tax, shipping and the final total. place_order verifies that quote
+locally and only has to reserve inventory; nothing is re-priced.
+
+Quotes are signed with QUOTE_SECRET (default: JWT_SECRET), are bound to the
+user they were issued to and expire after QUOTE_TTL_SECONDS.
+"""
+import os
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+QUOTE_TTL_SECONDS = int(os.getenv('QUOTE_TTL_SECONDS', 900))
+QUOTE_SALT = 'roastdirect.cart-quote'
+
+
+class QuoteError(ValueError):
+    """Raised when a quote cannot be used; the message is safe to return to the client"""
+
+
+def _serializer():
+    secret_key = os.getenv('QUOTE_SECRET') or os.getenv('JWT_SECRET')
+    if not secret_key:
+        raise ValueError("QUOTE_SECRET or JWT_SECRET environment variable is required")
+    return URLSafeTimedSerializer(secret_key, salt=QUOTE_SALT)
+
+
+def issue_quote(user_id, items, subtotal, totals=None):
+    """
+    Sign a quote for `user_id`.
+    items: [product_id, quantity, grind_option, price_at_time, product_snapshot] lists
+    totals: tax_amount, shipping_cost and final_total once they have been calculated
+    """
+    payload = {'u': str(user_id), 'i': items, 's': subtotal}
+    if totals:
+        payload['t'] = totals
+    return _serializer().dumps(payload)
+
+
+def verify_quote(token, user_id, require_totals=False):
+    """Return the quote payload, or raise QuoteError when it is forged, expired or not this user's"""
+    try:
+        payload = _serializer().loads(token, max_age=QUOTE_TTL_SECONDS)
+    except SignatureExpired:
+        raise QuoteError('Quote has expired, please recalculate your order total')
+    except BadSignature:
+        raise QuoteError('Invalid quote')
+
+    if payload.get('u') != str(user_id):
+        raise QuoteError('Invalid quote')
+    if require_totals and 't' not in payload:
+        raise QuoteError('Quote does not include order totals')
+    return payload
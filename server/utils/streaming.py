@@ -0,0 +1,67 @@
+"""
+Streaming JSON responses.
+
+Listing endpoints normally build the full result list and serialize it in
+one go, so peak memory grows with the result size. In streaming mode the
+body is written item by item while the PyMongo cursor is iterated in
+batches of STREAMING_BATCH_SIZE, which keeps memory per request flat.
+
+The envelope is the same as the buffered response, but keys whose values
+are only known once every item has been seen (count, next_cursor, message)
+come after the item list. Streaming is chosen with ?stream=1 or, for every
+request, with JSON_STREAMING=true. Streamed bodies are not cached or
+compressed, and their Server-Timing header is sent before the cursor is
+read, so it only counts queries issued up to that point.
+"""
+import os
+
+from flask import Response, current_app, stream_with_context
+
+STREAMING_BATCH_SIZE = int(os.getenv('STREAMING_BATCH_SIZE', 100))
+JSON_STREAMING = os.getenv('JSON_STREAMING', 'false').lower() == 'true'
+
+
+def wants_streaming(args):
+    """Whether the request asked for a streamed body (?stream=1|true|0|false overrides the default)"""
+    value = args.get('stream')
+    if value is None:
+        return JSON_STREAMING
+    return value.lower() in ('1', 'true')
+
+
+def batched(cursor, batch_size=None):
+    """Yield lists of up to batch_size documents from a cursor, closing it when done or abandoned"""
+    batch_size = batch_size or STREAMING_BATCH_SIZE
+    try:
+        batch = []
+        for document in cursor.batch_size(batch_size):
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close()
+
+
+def stream_json_list(items_key, items, tail):
+    """
+    Stream `{"<items_key>": [...], **tail()}`.
+    `items` is an iterable of JSON-serializable objects; `tail` is called after
+    the last item and returns the remaining envelope keys.
+    """
+    def generate():
+        dumps = current_app.json.dumps
+        yield '{' + dumps(items_key) + ':['
+        first = True
+        for item in items:
+            yield dumps(item) if first else ',' + dumps(item)
+            first = False
+        yield ']'
+        for key, value in tail().items():
+            yield ',' + dumps(key) + ':' + dumps(value)
+        yield '}\n'
+
+    # Keep the request context alive while the body is produced (g, query accounting)
+    return Response(stream_with_context(generate()), mimetype='application/json')
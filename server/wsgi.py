@@ -0,0 +1,9 @@
+"""
+Production WSGI entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+app.py builds the application at import time; it is reused here so each
+worker creates exactly one app.
+"""
+from app import app